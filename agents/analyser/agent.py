@@ -7,368 +7,305 @@ from bedrock_agentcore.runtime import BedrockAgentCoreApp
 from strands import Agent, tool
 from strands.models.bedrock import BedrockModel
 import os
+import gzip
 import json
+import logging
+import re
+import time
 import boto3
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import replace
+
+from cache import layout_cache, load_signature, restore_layout, strip_layout
+from fleet import (
+    assign_fleet,
+    estimate_fleet,
+    fleet_score,
+    pack_into_fleet,
+    screen_load,
+    search_fleet,
+    vehicle_lower_bound,
+)
+from packing import (
+    PALLET_NAME,
+    ItemRun,
+    PackingContainer,
+    PackingItem,
+    PackingOptions,
+    PlacementTable,
+    container_volume,
+    expand_runs,
+    pack_items_in_container,
+    tiling_library,
+    validate_packing,
+    whole_mm,
+)
+from pallets import palletize, unload_pallets, unpalletize
+from profiles import PackingProfile, log_event, profiling
 
 # AWS clients
 s3_client = boto3.client("s3")
 
+logger = logging.getLogger(__name__)
+
 # Environment variables
 ORDER_API_URL = os.getenv("ORDER_API_URL", "http://localhost:8000/api/orders")
 TRANSPORT_API_URL = os.getenv(
     "TRANSPORT_API_URL", "http://localhost:3000/api/transport"
 )
 S3_BUCKET = os.getenv("S3_LAYOUTS_BUCKET", "logistics-packing-layouts")
+# Saved vehicle layouts: "json" (package objects) or "columnar", gzip-compressed
+# unless LAYOUT_COMPRESSION is "none"
+LAYOUT_FORMAT = os.getenv("LAYOUT_FORMAT", "json")
+LAYOUT_COMPRESSION = os.getenv("LAYOUT_COMPRESSION", "gzip")
+# Keep tool calls well inside the orchestrator's 180 s read timeout, with
+# room left for the model and the other tools of the same request
+PACKING_TIME_BUDGET_S = float(os.getenv("PACKING_TIME_BUDGET_S", "25"))
+# Profile every packing run (counters and phase timers in summary and logs)
+PACKING_PROFILE = os.getenv("PACKING_PROFILE", "").lower() in ("1", "true", "yes")
 
 # Initialize BedrockAgentCoreApp
 app = BedrockAgentCoreApp()
 
 
-# ==================== PACKING ALGORITHM ====================
-
-
-@dataclass
-class PackingItem:
-    name: str
-    length_mm: float
-    width_mm: float
-    height_mm: float
-    weight_kg: float
-    fragile: bool = False
-
-    def volume(self) -> float:
-        return self.length_mm * self.width_mm * self.height_mm
-
-
-@dataclass
-class PackingContainer:
-    id: str
-    length_mm: float
-    width_mm: float
-    height_mm: float
-    max_weight_kg: float
-
-
-def calculate_support_height(x, y, width, length, placements):
-    """Calculate height at which item should be placed based on items below.
-    Requires minimal support (at least 80% overlap) to prevent floating."""
-    max_height = 0.0
-
-    for p in placements:
-        px, py, pz = p["position_mm"]
-        pl, pw, ph = p["dimensions_mm"]
-
-        # Calculate overlap in X-Z plane (length-width)
-        overlap_x_start = max(x, px)
-        overlap_x_end = min(x + length, px + pl)
-        overlap_z_start = max(y, py)  # y is width in our coordinate system
-        overlap_z_end = min(y + width, py + pw)
-
-        # Check if there's any overlap in the horizontal plane
-        if overlap_x_start < overlap_x_end and overlap_z_start < overlap_z_end:
-            overlap_area = (overlap_x_end - overlap_x_start) * (
-                overlap_z_end - overlap_z_start
-            )
-            item_area = length * width
-            support_ratio = overlap_area / item_area
-
-            # Require at least 80% support - prevents floating while allowing some flexibility
-            if support_ratio >= 0.80:
-                max_height = max(max_height, pz + ph)
+# ==================== PACKING PIPELINE ====================
 
-    return max_height
 
+def build_items(commodities) -> List[ItemRun]:
+    """One ItemRun per commodity run: a single PackingItem and its quantity.
 
-def check_collision(x, y, z, length, width, height, all_placements):
-    """Check if item would collide with existing items."""
-    for p in all_placements:
-        px, py, pz = p["position_mm"]
-        pl, pw, ph = p["dimensions_mm"]
+    The load stays in runs through screening, the load signature, order
+    assignment and block building; only the position search expands it.
+    """
+    return [
+        ItemRun(
+            PackingItem(
+                name=c["name"],
+                length_mm=c["length_mm"],
+                width_mm=c["width_mm"],
+                height_mm=c["height_mm"],
+                weight_kg=c["weight_kg"],
+                fragile=bool(c.get("fragile", False)),
+                upright=bool(c.get("upright", False)),
+                order_id=c.get("order_id"),
+            ),
+            int(c.get("quantity", 1)),
+        )
+        for c in commodities
+    ]
 
-        # Check overlap in all 3 dimensions
-        overlap_x = not (x >= px + pl or x + length <= px)
-        overlap_y = not (y >= py + pw or y + width <= py)
-        overlap_z = not (z >= pz + ph or z + height <= pz)
 
-        if overlap_x and overlap_y and overlap_z:
-            return True
-    return False
+def container_result(container, placements) -> Dict[str, Any]:
+    """One packed container as listed in the packing results."""
+    return {
+        "id": container.id,
+        "dimensions_mm": {
+            "length": container.length_mm,
+            "width": container.width_mm,
+            "height": container.height_mm,
+        },
+        "max_weight_kg": container.max_weight_kg,
+        "placements": placements,
+    }
 
 
-def find_best_position(
-    item, container, all_placements, start_z, max_height, prefer_front
-):
-    """Find the best position: only stack with proper support, otherwise use floor."""
-    candidates = []
-
-    # Try positions in a grid pattern
-    step_x = min(200, item.length_mm)
-    step_y = min(200, item.width_mm)
-
-    for x in range(0, int(container.length_mm - item.length_mm + 1), int(step_x)):
-        for y in range(0, int(container.width_mm - item.width_mm + 1), int(step_y)):
-            # Calculate support height at this position
-            support_z = calculate_support_height(
-                x, y, item.width_mm, item.length_mm, all_placements
+def run_fleet_search(items, container_objs, options):
+    """Pack the load with the fleet search named in the options."""
+    if options.fleet_search == "assign":
+        packed, unplaced = assign_fleet(items, container_objs, options)
+        if unplaced:
+            # Short of room or payload, the plain fill can place more
+            packed, unplaced = min(
+                (packed, unplaced),
+                pack_into_fleet(items, container_objs, options),
+                key=lambda run: fleet_score(
+                    [r for r in run[0] if len(r[1])], run[1], options.objective
+                ),
             )
+            packed = [run for run in packed if len(run[1])]
+    elif options.fleet_search == "parallel" or options.restarts:
+        packed, unplaced = search_fleet(items, container_objs, options)
+    elif options.fleet_search == "sequential":
+        packed, unplaced = pack_into_fleet(items, container_objs, options)
+    else:
+        raise ValueError(f"Unknown fleet search: {options.fleet_search}")
+    return unload_pallets(packed, unplaced, container_objs, options)
 
-            # Only use support height if it's actually supported, otherwise use floor
-            if support_z > 0.0:
-                final_z = support_z  # Has proper support
-                is_stacked = True
-            else:
-                final_z = 0.0  # No support, go to floor
-                is_stacked = False
-
-            # Check height constraint
-            if final_z + item.height_mm > max_height:
-                continue
-
-            # Check for collisions
-            if check_collision(
-                x,
-                y,
-                final_z,
-                item.length_mm,
-                item.width_mm,
-                item.height_mm,
-                all_placements,
-            ):
-                continue
-
-            # Scoring: prefer stacking with proper support
-            stacking_bonus = 100 if is_stacked else 0
-
-            # Apply fragile preference
-            fragile_penalty = 0
-            if prefer_front and x > container.length_mm * 0.6:
-                fragile_penalty = 50
-
-            # Final score: higher is better
-            score = stacking_bonus - fragile_penalty - final_z * 0.001
-
-            candidates.append((score, x, y, final_z))
-
-    # Return best candidate (highest score)
-    if candidates:
-        candidates.sort(reverse=True)
-        _, x, y, z = candidates[0]
-        return (x, y, z)
 
-    return None
+def anytime_attempts(options) -> List[PackingOptions]:
+    """Packing runs of an anytime search, cheapest first.
 
+    The height-map fill gives a layout within a fraction of the budget; the
+    requested search then tries to improve on it if the fill left units out.
+    The search ends with the requested run, so a budget only ever cuts a run
+    short.
+    """
+    fast = replace(options, engine="heightmap")
+    return [fast, options] if fast != options else [options]
 
-def shelf_pack(
-    items,
-    container,
-    start_z=0.0,
-    start_order=1,
-    max_height=None,
-    prefer_front=False,
-    existing_placements=None,
-):
-    """3D packing that prioritizes stacking over floor coverage."""
-    placements = []
-    leftover = []
-    order = start_order
-    max_height = max_height or container.height_mm
-    all_placements = list(existing_placements or [])
-
-    for item in items:
-        # Find best position for this item
-        pos = find_best_position(
-            item, container, all_placements, start_z, max_height, prefer_front
-        )
-
-        if pos is None:
-            leftover.append(item)
-            continue
 
-        x, y, z = pos
+def search_load(items, container_objs, options, time_budget_s):
+    """The fleet search of pack_load, as an anytime search with a budget.
 
-        # Place item
-        placement = {
-            "item_name": item.name,
-            "dimensions_mm": [item.length_mm, item.width_mm, item.height_mm],
-            "position_mm": [x, y, z],
-            "placement_order": order,
-            "fragile": item.fragile,
-        }
-        placements.append(placement)
-        all_placements.append(placement)
-        order += 1
-
-    # Calculate actual used height
-    used_height = start_z
-    if placements:
-        used_height = max(
-            p["position_mm"][2] + p["dimensions_mm"][2] for p in placements
+    Returns (packed, unplaced, completed, attempts_finished), with only the
+    vehicles that hold something and unplaced pallets as their cartons;
+    attempts_finished is None without a budget.
+    """
+    if time_budget_s is None:
+        packed, unplaced = run_fleet_search(items, container_objs, options)
+        completed, attempts = True, None
+    else:
+        packed, unplaced, completed, attempts = anytime_search(
+            items, container_objs, options, max(time_budget_s, 0.0)
         )
+    packed = [(c, placements) for c, placements in packed if len(placements)]
+    return packed, unpalletize(unplaced), completed, attempts
 
-    return placements, used_height, leftover
-
-
-def pack_items_in_container(container, items):
-    """Pack items into a single container with gravity support."""
-    fragile = [i for i in items if i.fragile]
-    non_fragile = [i for i in items if not i.fragile]
 
-    non_fragile.sort(key=lambda i: i.weight_kg, reverse=True)
-    fragile.sort(key=lambda i: i.weight_kg, reverse=True)
+def anytime_search(items, container_objs, options, time_budget_s):
+    """Run a fast search, then the requested one, within the budget.
 
-    placements = []
-    leftover_total = []
-    placement_order = 1
+    Returns as soon as a run places every unit in a valid layout, or when
+    the requested search finishes. A run cut off by the deadline still
+    returns a valid, partial layout, and runs compete on (validation errors,
+    fleet_score), so the result is the best valid layout found in time.
 
-    heavy, medium = [], []
-    if non_fragile:
-        weights = [i.weight_kg for i in non_fragile]
-        median_weight = sorted(weights)[len(weights) // 2]
-        heavy = [i for i in non_fragile if i.weight_kg >= median_weight]
-        medium = [i for i in non_fragile if i.weight_kg < median_weight]
-
-    used_height = 0.0
-
-    # Pack heavy items at bottom
-    if heavy:
-        heavy_res, used_height, leftover_h = shelf_pack(
-            heavy, container, used_height, placement_order, None, False, placements
-        )
-        placements.extend(heavy_res)
-        leftover_total.extend(leftover_h)
-        placement_order += len(heavy_res)
-
-    # Pack medium items on top of heavy items
-    if medium:
-        mid_res, used_height, leftover_m = shelf_pack(
-            medium, container, used_height, placement_order, None, False, placements
+    Returns (packed, unplaced, completed, attempts_finished).
+    """
+    deadline = time.time() + time_budget_s
+    best_key = best = None
+    finished = 0
+    completed = False
+    for attempt in anytime_attempts(options):
+        packed, unplaced = run_fleet_search(
+            items, container_objs, replace(attempt, deadline=deadline)
         )
-        placements.extend(mid_res)
-        leftover_total.extend(leftover_m)
-        placement_order += len(mid_res)
-
-    # Pack fragile items on top (door preference relaxed for space efficiency)
-    if fragile:
-        f_res, _, leftover_f = shelf_pack(
-            fragile, container, used_height, placement_order, None, True, placements
+        # A run cut off early leaves the vehicles after it empty
+        packed = [(c, placements) for c, placements in packed if placements]
+        invalid = any(
+            validate_packing(placements, container, options)
+            for container, placements in packed
         )
-        placements.extend(f_res)
-        leftover_total.extend(leftover_f)
-
-        # If fragile items couldn't fit due to door preference, try again without preference
-        if leftover_f:
-            f_res2, _, leftover_f2 = shelf_pack(
-                leftover_f,
-                container,
-                used_height,
-                placement_order + len(f_res),
-                None,
-                False,
-                placements + f_res,
-            )
-            placements.extend(f_res2)
-            leftover_total = [item for item in leftover_total if item not in f_res2]
-            leftover_total.extend(leftover_f2)
+        key = (invalid,) + fleet_score(packed, unplaced, options.objective)
+        if best_key is None or key < best_key:
+            best_key, best = key, (packed, unplaced)
+        if time.time() > deadline:
+            break
+        finished += 1
+        if not invalid and not unplaced:
+            # Nothing left for a slower run to place
+            completed = True
+            break
+    else:
+        completed = True
+    return best[0], best[1], completed, finished
+
 
-    return placements, leftover_total
+def choose_containers_and_pack(
+    commodities, containers, options=None, cache=None, time_budget_s=None
+):
+    """Tries to fit items into as few containers as possible.
 
+    With a LayoutCache, a load seen before is answered from the cache and its
+    stored geometry is remapped onto the new item names.
 
-def validate_packing(placements: List[Dict], container) -> List[str]:
-    """Validate packing for overlaps and bounds violations."""
-    errors = []
+    With a time budget (seconds) the search runs as an anytime search and
+    returns the best layout found when the budget runs out; the summary
+    reports the time spent and whether the search completed.
 
-    for i, p1 in enumerate(placements):
-        # Check bounds
-        x1, y1, z1 = p1["position_mm"]
-        l1, w1, h1 = p1["dimensions_mm"]
+    With profiling (options.profile or PACKING_PROFILE) the summary carries
+    the run's PackingProfile under "profile", which is also logged.
+    """
+    options = options or PackingOptions()
+    if not (options.profile or PACKING_PROFILE):
+        return pack_load(commodities, containers, options, cache, time_budget_s)
+
+    with profiling(PackingProfile()) as profile:
+        results = pack_load(commodities, containers, options, cache, time_budget_s)
+    results["summary"]["profile"] = profile.as_dict()
+    log_event(
+        "packing_profile",
+        items=results["summary"]["total_items"],
+        containers=results["summary"]["total_containers_used"],
+        elapsed_s=results["summary"]["elapsed_s"],
+        **results["summary"]["profile"],
+    )
+    return results
 
-        if x1 < 0 or y1 < 0 or z1 < 0:
-            errors.append(
-                f"Item {p1['item_name']} has negative position: ({x1}, {y1}, {z1})"
-            )
 
-        if x1 + l1 > container.length_mm:
-            errors.append(f"Item {p1['item_name']} exceeds container length")
-        if y1 + w1 > container.width_mm:
-            errors.append(f"Item {p1['item_name']} exceeds container width")
-        if z1 + h1 > container.height_mm:
-            errors.append(f"Item {p1['item_name']} exceeds container height")
-
-        # Check overlaps with other items
-        for j, p2 in enumerate(placements[i + 1 :], start=i + 1):
-            x2, y2, z2 = p2["position_mm"]
-            l2, w2, h2 = p2["dimensions_mm"]
-
-            # Check if boxes overlap in all 3 dimensions
-            overlap_x = not (x1 + l1 <= x2 or x2 + l2 <= x1)
-            overlap_y = not (y1 + w1 <= y2 or y2 + w2 <= y1)
-            overlap_z = not (z1 + h1 <= z2 or z2 + h2 <= z1)
-
-            if overlap_x and overlap_y and overlap_z:
-                errors.append(
-                    f"Overlap detected: {p1['item_name']} at ({x1},{y1},{z1}) and {p2['item_name']} at ({x2},{y2},{z2})"
-                )
-
-    return errors
-
-
-def choose_containers_and_pack(commodities, containers):
-    """Tries to fit items into as few containers as possible."""
-    items = []
-    for c in commodities:
-        for _ in range(int(c.get("quantity", 1))):
-            items.append(
-                PackingItem(
-                    name=c["name"],
-                    length_mm=c["length_mm"],
-                    width_mm=c["width_mm"],
-                    height_mm=c["height_mm"],
-                    weight_kg=c["weight_kg"],
-                    fragile=bool(c.get("fragile", False)),
-                )
-            )
+def pack_load(commodities, containers, options, cache, time_budget_s):
+    """choose_containers_and_pack without the profiling switch."""
+    started = time.perf_counter()
+    runs = build_items(commodities)
 
     container_objs = sorted(
         [PackingContainer(**ct) for ct in containers],
-        key=lambda c: c.length_mm * c.width_mm * c.height_mm,
+        key=container_volume,
     )
 
-    total_volume = sum(i.volume() for i in items)
-    total_weight = sum(i.weight_kg for i in items)
+    total_weight = sum(r.weight_kg() for r in runs)
 
     results = {
         "containers": [],
-        "summary": {"total_items": len(items), "total_weight_kg": total_weight},
+        "summary": {
+            "total_items": sum(r.quantity for r in runs),
+            "total_weight_kg": total_weight,
+        },
     }
 
-    current_items = items
-    container_index = 0
-    while current_items and container_index < len(container_objs):
-        container = container_objs[container_index]
-        placements, leftover = pack_items_in_container(container, current_items)
+    signature = stored = None
+    if cache is not None:
+        signature = load_signature(runs, container_objs, options)
+        stored = cache.get(signature)
+
+    completed = True
+    if stored is not None:
+        packed, current_items = restore_layout(stored, runs, container_objs)
+    else:
+        # Bounds first: no search is spent on vehicles or units they rule out
+        fleet, usable, unfit, bounds = screen_load(runs, container_objs, options)
+        results["summary"]["bounds"] = {
+            "vehicle_lower_bound": vehicle_lower_bound(usable, fleet),
+            "screened_containers": [c.id for c in container_objs if c not in fleet],
+            "screened_items": len(unfit),
+            "per_container": {
+                cid: {"by_volume": b.by_volume, "by_weight": b.by_weight}
+                for cid, b in bounds.items()
+            },
+        }
+
+        # The position search places units one by one
+        usable = expand_runs(usable)
+        search = search_load(usable, fleet, options, time_budget_s)
+        if options.pallets:
+            # Two levels: cartons onto pallets, then the pallets into vehicles,
+            # kept only if that beats packing the cartons loose
+            if time_budget_s is not None:
+                time_budget_s -= time.perf_counter() - started
+            palletized = search_load(
+                palletize(usable, fleet, options), fleet, options, time_budget_s
+            )
+            search = min(
+                search,
+                palletized,
+                key=lambda run: fleet_score(run[0], run[1], options.objective),
+            )
+            results["summary"]["pallets"] = sum(
+                placements.names.count(PALLET_NAME) for _, placements in search[0]
+            )
+
+        packed, current_items, completed, attempts = search
+        if attempts is not None:
+            results["summary"]["search_attempts"] = attempts
+        current_items = unpalletize(current_items) + expand_runs(unfit)
 
+    for container, placements in packed:
         # Validate packing
-        validation_errors = validate_packing(placements, container)
+        validation_errors = validate_packing(placements, container, options)
         if validation_errors:
             results["validation_warnings"] = validation_errors
 
-        results["containers"].append(
-            {
-                "id": container.id,
-                "dimensions_mm": {
-                    "length": container.length_mm,
-                    "width": container.width_mm,
-                    "height": container.height_mm,
-                },
-                "max_weight_kg": container.max_weight_kg,
-                "placements": placements,
-            }
-        )
-
-        current_items = leftover
-        container_index += 1
+        results["containers"].append(container_result(container, placements))
 
     if current_items:
         results["unplaced_items"] = [i.name for i in current_items]
@@ -379,6 +316,19 @@ def choose_containers_and_pack(commodities, containers):
         results["summary"]["note"] = "All items successfully packed across containers."
 
     results["summary"]["total_containers_used"] = len(results["containers"])
+    results["summary"]["fleet_search"] = options.fleet_search
+    results["summary"]["elapsed_s"] = round(time.perf_counter() - started, 3)
+    results["summary"]["search_completed"] = completed
+
+    if cache is not None:
+        # Only clean, finished layouts are worth replaying
+        if stored is None and completed and "validation_warnings" not in results:
+            cache.put(
+                signature, strip_layout(results, current_items, runs, container_objs)
+            )
+        results["summary"]["cache"] = dict(
+            cache.stats(), result="hit" if stored is not None else "miss"
+        )
 
     return results
 
@@ -405,100 +355,385 @@ def fetch_available_vehicles() -> List[Dict]:
     ]
 
 
-def prepare_commodities(products: List[Dict]) -> Tuple[List[Dict], Dict[str, float]]:
-    """Convert products to commodities format and build weight map."""
-    commodities = []
-    weight_map = {}
-    for item in products:
-        product = item["product"]
-        weight_map[product["label"]] = product["weight"]
-        commodities.append(
-            {
-                "name": product["label"],
-                "length_mm": product["length"],
-                "width_mm": product["width"],
-                "height_mm": product["height"],
-                "weight_kg": product["weight"],
-                "quantity": item["quantity"],
-                "fragile": product.get("fragility", False),
-            }
-        )
-    return commodities, weight_map
+def prepare_commodities(products: List[Dict]) -> List[Dict]:
+    """Convert products to commodity runs, one per product line."""
+    return [
+        {
+            "name": item["product"]["label"],
+            "length_mm": item["product"]["length"],
+            "width_mm": item["product"]["width"],
+            "height_mm": item["product"]["height"],
+            "weight_kg": item["product"]["weight"],
+            "quantity": item["quantity"],
+            "fragile": item["product"].get("fragility", False),
+        }
+        for item in products
+    ]
 
 
-def prepare_commodities_batch(
-    products: List[Dict],
-) -> Tuple[List[Dict], Dict[str, float], Dict[str, int]]:
-    """Convert products from multiple orders to commodities format with unique names.
+def prepare_commodities_batch(products: List[Dict]) -> List[Dict]:
+    """Convert products from multiple orders to commodity runs tagged by order.
+
+    Each product line stays one run of `quantity` units with its order_id;
+    unique per-unit names are only generated in transform_to_ui_format.
 
     Args:
         products: List with structure [{"order_id": int, "quantity": int, "product": {...}}]
 
     Returns:
-        (commodities_list, weight_map, item_order_map)
+        commodities_list
     """
-    commodities = []
-    weight_map = {}
-    item_order_map = {}  # Maps item_name to order_id
-    global_counter = 0  # Global counter for all items
+    commodities = prepare_commodities(products)
+    for commodity, item in zip(commodities, products):
+        commodity["order_id"] = item["order_id"]
+    return commodities
 
-    for item in products:
-        product = item["product"]
-        order_id = item["order_id"]
-        quantity = item["quantity"]
-        base_name = product["label"]
 
-        # Create separate commodity for each instance
-        for i in range(quantity):
-            global_counter += 1
-            unique_name = f"{base_name}-order{order_id}-item{global_counter}"
+def vehicle_entry(index: int, key: str, vehicle: Dict[str, Any]) -> Dict[str, Any]:
+    """Manifest entry of one vehicle layout: where it is and what it holds."""
+    packages = vehicle["packages"]
+    return {
+        "index": index,
+        "id": vehicle["container"].get("id"),
+        "key": key,
+        "size": vehicle["container"]["size"],
+        "maxWeight": vehicle["container"].get("maxWeight"),
+        "total_packages": len(packages),
+        "total_weight_kg": round(sum(p.get("weight", 0) for p in packages), 2),
+        "order_ids": sorted({p["order_id"] for p in packages if "order_id" in p}),
+    }
 
-            weight_map[unique_name] = product["weight"]
-            item_order_map[unique_name] = order_id
 
-            commodities.append(
-                {
-                    "name": unique_name,
-                    "length_mm": product["length"],
-                    "width_mm": product["width"],
-                    "height_mm": product["height"],
-                    "weight_kg": product["weight"],
-                    "quantity": 1,  # Each commodity is a single item
-                    "fragile": product.get("fragility", False),
-                }
-            )
+# Keys of a package that the columnar layout format can rebuild (order_id
+# is the only optional one)
+COLUMNAR_PACKAGE_KEYS = {
+    "id",
+    "position",
+    "size",
+    "weight",
+    "color",
+    "label",
+    "product",
+    "placementOrder",
+    "fragile",
+    "orientation",
+    "order_id",
+}
+# Coordinate scales tried by the columnar format, finest last
+COLUMNAR_SCALES = (1, 10, 100, 1000)
+ORDER_LABEL = re.compile(r"-order(\d+)-item(\d+)$")
+
+
+def package_slug(label: str) -> str:
+    """Package id prefix transform_to_ui_format derives from a label."""
+    return label.lower().replace(" ", "-")
+
+
+def columnar_scale(values) -> Optional[int]:
+    """Smallest scale at which every value is a whole number, if any."""
+    for scale in COLUMNAR_SCALES:
+        if all(abs(v * scale - round(v * scale)) < 1e-6 for v in values):
+            return scale
+    return None
+
 
-    return commodities, weight_map, item_order_map
+def to_columnar(vehicle: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Columnar form of a vehicle layout, or None if it would lose anything.
+
+    One list per package field instead of one object per package. Products,
+    colors and orientations are stored once and referenced by index, labels
+    and ids are rebuilt from product, order id and item number, and
+    coordinates and sizes are integers in 1/scale mm.
+    """
+    packages = vehicle["packages"]
+    keys = ("x", "y", "z", "length", "width", "height")
+    columns: Dict[str, List] = {
+        k: []
+        for k in keys
+        + ("product", "color", "order_id", "item", "copy", "weight")
+        + ("placementOrder", "fragile", "orientation")
+    }
+    dictionaries: Dict[str, Dict[str, int]] = {
+        "products": {},
+        "colors": {},
+        "orientations": {},
+    }
+
+    for pkg in packages:
+        if set(pkg) | {"order_id"} != COLUMNAR_PACKAGE_KEYS:
+            return None
+        order_id = pkg.get("order_id")
+        label, item = pkg["product"], 0
+        if order_id is not None:
+            match = ORDER_LABEL.search(pkg["label"])
+            if not match or int(match.group(1)) != order_id:
+                return None
+            item = int(match.group(2))
+            label = f"{pkg['product']}-order{order_id}-item{item}"
+        copy = pkg["id"][len(package_slug(label)) + 1 :]
+        if (
+            label != pkg["label"]
+            or not copy.isdigit()
+            or pkg["id"] != f"{package_slug(label)}-{copy}"
+        ):
+            return None
+
+        for name, value, key in (
+            ("products", pkg["product"], "product"),
+            ("colors", pkg["color"], "color"),
+            ("orientations", pkg["orientation"], "orientation"),
+        ):
+            codes = dictionaries[name]
+            columns[key].append(codes.setdefault(value, len(codes)))
+        columns["order_id"].append(order_id)
+        columns["item"].append(item)
+        columns["copy"].append(int(copy))
+        columns["weight"].append(pkg["weight"])
+        columns["placementOrder"].append(pkg["placementOrder"])
+        columns["fragile"].append(int(bool(pkg["fragile"])))
+        for axis in ("x", "y", "z"):
+            columns[axis].append(pkg["position"][axis])
+        for axis in ("length", "width", "height"):
+            columns[axis].append(pkg["size"][axis])
+
+    scale = columnar_scale([v for k in keys for v in columns[k]])
+    if scale is None:
+        return None
+    for k in keys:
+        columns[k] = [round(v * scale) for v in columns[k]]
+
+    return {
+        "format": "columnar",
+        "container": vehicle["container"],
+        "scale": scale,
+        **{name: list(values) for name, values in dictionaries.items()},
+        "columns": columns,
+    }
+
+
+def from_columnar(layout: Dict[str, Any]) -> Dict[str, Any]:
+    """Vehicle layout with package objects, from its columnar form."""
+    columns, scale = layout["columns"], layout["scale"]
+    packages = []
+    for n in range(len(columns["x"])):
+        product = layout["products"][columns["product"][n]]
+        order_id = columns["order_id"][n]
+        label = product
+        if order_id is not None:
+            label = f"{product}-order{order_id}-item{columns['item'][n]}"
+        package = {
+            "id": f"{package_slug(label)}-{columns['copy'][n]}",
+            "position": {a: whole_mm(columns[a][n] / scale) for a in ("x", "y", "z")},
+            "size": {
+                a: whole_mm(columns[a][n] / scale)
+                for a in ("length", "height", "width")
+            },
+            "weight": columns["weight"][n],
+            "color": layout["colors"][columns["color"][n]],
+            "label": label,
+            "product": product,
+            "placementOrder": columns["placementOrder"][n],
+            "fragile": bool(columns["fragile"][n]),
+            "orientation": layout["orientations"][columns["orientation"][n]],
+        }
+        if order_id is not None:
+            package["order_id"] = order_id
+        packages.append(package)
+    return {"container": layout["container"], "packages": packages}
+
+
+def encode_layout_object(layout: Dict[str, Any]) -> Tuple[bytes, Optional[str]]:
+    """JSON body of a saved layout object and its Content-Encoding.
+
+    No indentation or spaces; gzip-compressed unless LAYOUT_COMPRESSION is
+    "none" (mtime 0, so the same layout always gives the same bytes).
+    """
+    body = json.dumps(layout, separators=(",", ":")).encode()
+    if LAYOUT_COMPRESSION == "none":
+        return body, None
+    return gzip.compress(body, compresslevel=6, mtime=0), "gzip"
+
+
+def put_layout_object(key: str, layout: Dict[str, Any]):
+    body, encoding = encode_layout_object(layout)
+    extra = {"ContentEncoding": encoding} if encoding else {}
+    s3_client.put_object(
+        Bucket=S3_BUCKET, Key=key, Body=body, ContentType="application/json", **extra
+    )
+
+
+def decode_layout_object(body: bytes) -> Dict[str, Any]:
+    """A saved layout object in any format, with package objects."""
+    if body[:2] == b"\x1f\x8b":  # gzip magic, whatever the stored metadata says
+        body = gzip.decompress(body)
+    layout = json.loads(body)
+    if layout.get("format") == "columnar":
+        return from_columnar(layout)
+    return layout
 
 
 def save_layout_to_s3(
     identifier: str, layout: Dict[str, Any], is_batch: bool = False
 ) -> str:
-    """Save layout JSON to S3 and return S3 key.
+    """Save a layout to S3 as a manifest plus one object per vehicle.
+
+    Each vehicle layout goes to <manifest key without .json>/vehicle-<n>.json,
+    so a viewer only downloads the vehicle it displays. The manifest keeps the
+    layout's other fields (batch_id, order_ids) and one entry per vehicle.
+    Objects are compact JSON, gzip-compressed with a matching Content-Encoding,
+    and vehicles are columnar with LAYOUT_FORMAT=columnar (see to_columnar).
 
     Args:
         identifier: order_id (int) or batch_id (str)
         layout: Layout data to save
         is_batch: True if saving batch layout, False for single order
+
+    Returns:
+        S3 key of the manifest
     """
     from datetime import datetime
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Milliseconds, so a layout saved again within the second gets a key of its own
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
 
     if is_batch:
-        s3_key = f"layouts/{identifier}-{timestamp}.json"
+        base_key = f"layouts/{identifier}-{timestamp}"
     else:
-        s3_key = f"layouts/order-{identifier}-{timestamp}.json"
+        base_key = f"layouts/order-{identifier}-{timestamp}"
+
+    manifest = {k: v for k, v in layout.items() if k != "containers"}
+    manifest["containers"] = []
+    for index, vehicle in enumerate(layout["containers"]):
+        vehicle_key = f"{base_key}/vehicle-{index + 1}.json"
+        stored = vehicle
+        if LAYOUT_FORMAT == "columnar":
+            stored = to_columnar(vehicle) or vehicle
+        put_layout_object(vehicle_key, stored)
+        manifest["containers"].append(vehicle_entry(index, vehicle_key, vehicle))
+
+    s3_key = f"{base_key}.json"
+    put_layout_object(s3_key, manifest)
+    return s3_key
 
-    layout_json = json.dumps(layout, indent=2)
 
-    s3_client.put_object(
-        Bucket=S3_BUCKET,
-        Key=s3_key,
-        Body=layout_json,
-        ContentType="application/json",
+def layout_name(layout_key: str) -> str:
+    """Name a layout was saved under: its key without folder, timestamp and .json."""
+    name = os.path.basename(layout_key)
+    if name.endswith(".json"):
+        name = name[: -len(".json")]
+    return re.sub(r"-\d{8}_\d{6}(?:_\d{3})?$", "", name)
+
+
+def read_layout_object(key: str) -> Dict[str, Any]:
+    """Read one layout object from a local path, or else from S3 by key.
+
+    Plain, gzip-compressed and columnar objects all load as package objects.
+    """
+    if os.path.isfile(key):
+        with open(key, "rb") as f:
+            return decode_layout_object(f.read())
+    response = s3_client.get_object(Bucket=S3_BUCKET, Key=key)
+    return decode_layout_object(response["Body"].read())
+
+
+def load_layout(layout_key: str) -> Dict[str, Any]:
+    """Load a saved layout with the layouts of all of its vehicles.
+
+    Layouts saved as one object (a single container with its packages) load
+    as a layout with one vehicle.
+    """
+    layout = read_layout_object(layout_key)
+    if "packages" in layout:
+        vehicle = {
+            "container": layout.pop("container"),
+            "packages": layout.pop("packages"),
+        }
+        layout["containers"] = [vehicle]
+        return layout
+    layout["containers"] = [read_layout_object(e["key"]) for e in layout["containers"]]
+    return layout
+
+
+# Suffix transform_to_ui_format adds to the label of a unit of an order
+UNIT_LABEL_SUFFIX = re.compile(r"-order\d+-item\d+$")
+
+
+def package_product(pkg: Dict[str, Any]) -> str:
+    """Product name of a UI package.
+
+    Layouts written before packages carried "product" only have the unit
+    label, from which the generated "-order<id>-item<n>" suffix is dropped.
+    """
+    return pkg.get("product") or UNIT_LABEL_SUFFIX.sub("", pkg["label"])
+
+
+def layout_to_placements(
+    ui_layout: Dict[str, Any],
+) -> Tuple[PackingContainer, PlacementTable]:
+    """Rebuild the packing state of one vehicle layout of a UI layout.
+
+    Placements carry each package's product name, weight and order id.
+
+    Returns:
+        (container, placements)
+    """
+    size = ui_layout["container"]["size"]
+    container = PackingContainer(
+        id=ui_layout["container"].get("id") or "layout",
+        length_mm=size["length"],
+        width_mm=size["width"],
+        height_mm=size["height"],
+        # Layouts saved without a payload limit leave the load unchecked
+        max_weight_kg=ui_layout["container"].get("maxWeight") or float("inf"),
     )
-    return s3_key
+    offset_x = -container.length_mm / 2
+    offset_z = -container.width_mm / 2
+
+    placements = PlacementTable()
+    for pkg in ui_layout["packages"]:
+        placements.append(
+            package_product(pkg),
+            pkg["position"]["x"] - offset_x,
+            pkg["position"]["z"] - offset_z,
+            pkg["position"]["y"],
+            pkg["size"]["length"],
+            pkg["size"]["width"],
+            pkg["size"]["height"],
+            pkg.get("orientation", "lwh"),
+            pkg.get("placementOrder", len(placements) + 1),
+            pkg.get("fragile", False),
+            weight_kg=pkg.get("weight", 0),
+            order_id=pkg.get("order_id"),
+        )
+
+    return container, placements
+
+
+def layout_to_commodities(ui_layout: Dict[str, Any]) -> List[Dict]:
+    """Turn the packages of one vehicle layout back into commodity runs.
+
+    Packages of the same product, size, weight and order form one run;
+    pallet decks are left out.
+    """
+    runs: Dict[Tuple, Dict] = {}
+    for pkg in ui_layout["packages"]:
+        if package_product(pkg) == PALLET_NAME:
+            continue  # pallet decks are built again by the packing
+        commodity = {
+            "name": package_product(pkg),
+            "length_mm": pkg["size"]["length"],
+            "width_mm": pkg["size"]["width"],
+            "height_mm": pkg["size"]["height"],
+            "weight_kg": pkg.get("weight", 0),
+            "fragile": pkg.get("fragile", False),
+            "order_id": pkg.get("order_id"),
+        }
+        key = tuple(commodity.values())
+        if key in runs:
+            runs[key]["quantity"] += 1
+        else:
+            runs[key] = dict(commodity, quantity=1)
+    return list(runs.values())
 
 
 # ==================== TOOLS ====================
@@ -668,23 +903,31 @@ def generate_packing_layout(
     containers = available_containers or fetch_available_vehicles()
 
     # 2. Prepare data
-    commodities, weight_map = prepare_commodities(products)
+    commodities = prepare_commodities(products)
 
     # 3. Run packing algorithm
-    algorithm_output = choose_containers_and_pack(commodities, containers)
+    algorithm_output = choose_containers_and_pack(
+        commodities,
+        containers,
+        PackingOptions(tiling=tiling_library() is not None),
+        cache=layout_cache,
+        time_budget_s=PACKING_TIME_BUDGET_S,
+    )
 
     # 4. Transform to UI format
-    ui_layout = transform_to_ui_format(algorithm_output, weight_map)
+    ui_layout = transform_to_ui_format(algorithm_output)
 
     # 5. Save to S3
     s3_key = save_layout_to_s3(str(order_id), ui_layout, is_batch=False)
 
     # 6. Return summary
+    totals = layout_totals(ui_layout)
     return {
         "s3_key": s3_key,
-        "total_packages": len(ui_layout["packages"]),
-        "containers_used": 1,
-        "container_id": ui_layout["container"]["size"],
+        "total_packages": totals["total_packages"],
+        "containers_used": totals["containers_used"],
+        "container_id": totals["container_id"],
+        "layout_cache": algorithm_output["summary"]["cache"],
     }
 
 
@@ -710,16 +953,22 @@ def generate_batch_packing_layout(
     # 2. Get containers
     containers = available_containers or fetch_available_vehicles()
 
-    # 3. Prepare batch commodities with order_id tagging
-    commodities, weight_map, item_order_map = prepare_commodities_batch(
-        batch_data["products"]
+    # 3. Prepare batch commodity runs with order_id tagging
+    commodities = prepare_commodities_batch(batch_data["products"])
+
+    # 4. Run packing algorithm, assigning whole orders to vehicles
+    algorithm_output = choose_containers_and_pack(
+        commodities,
+        containers,
+        PackingOptions(
+            fleet_search="assign", tiling=tiling_library() is not None
+        ),
+        cache=layout_cache,
+        time_budget_s=PACKING_TIME_BUDGET_S,
     )
 
-    # 4. Run packing algorithm
-    algorithm_output = choose_containers_and_pack(commodities, containers)
-
     # 5. Transform to UI format with order_id tags
-    ui_layout = transform_to_ui_format(algorithm_output, weight_map, item_order_map)
+    ui_layout = transform_to_ui_format(algorithm_output)
 
     # Add batch metadata to layout
     ui_layout["batch_id"] = batch_id
@@ -729,18 +978,20 @@ def generate_batch_packing_layout(
     s3_key = save_layout_to_s3(batch_id, ui_layout, is_batch=True)
 
     # 7. Calculate totals
-    total_weight = sum(weight_map.values())
+    packages = [pkg for v in ui_layout["containers"] for pkg in v["packages"]]
+    total_weight = sum(c["weight_kg"] * c["quantity"] for c in commodities)
     total_volume = (
         sum(
             pkg["size"]["length"] * pkg["size"]["width"] * pkg["size"]["height"]
-            for pkg in ui_layout["packages"]
+            for pkg in packages
         )
         / 1_000_000_000
     )
+    totals = layout_totals(ui_layout)
 
     # 8. Build order-item mapping (count only, not full list)
     order_item_mapping = {}
-    for pkg in ui_layout["packages"]:
+    for pkg in packages:
         if "order_id" in pkg:
             oid = str(pkg["order_id"])
             if oid not in order_item_mapping:
@@ -755,90 +1006,273 @@ def generate_batch_packing_layout(
         "total_weight_kg": round(total_weight, 2),
         "total_volume_m3": round(total_volume, 3),
         "s3_key": s3_key,
-        "total_packages": len(ui_layout["packages"]),
-        "container_id": ui_layout["container"]["size"],
+        "total_packages": totals["total_packages"],
+        "containers_used": totals["containers_used"],
+        "container_id": totals["container_id"],
         "order_item_mapping": order_item_mapping,
+        "layout_cache": algorithm_output["summary"]["cache"],
     }
 
 
-def transform_to_ui_format(
-    algorithm_output: Dict[str, Any],
-    weight_map: Dict[str, float],
-    item_order_map: Optional[Dict[str, int]] = None,
+@tool
+def estimate_packing(
+    order_ids: list[int],
+    available_containers: Optional[List[Dict]] = None,
 ) -> Dict[str, Any]:
-    """Transform algorithm output to UI-compatible format.
+    """Estimate vehicles and fill for a batch of orders without packing it.
+
+    Uses volume, weight and per-dimension bounds plus a layer heuristic, so
+    it answers in milliseconds and writes nothing to S3. Use it to size
+    batches; generate_batch_packing_layout packs the batch that is chosen.
 
     Args:
-        algorithm_output: Output from packing algorithm
-        weight_map: Maps item names to weights
-        item_order_map: Optional map of item names to order_ids (for batch processing)
+        order_ids: List of order IDs to estimate together
+        available_containers: Optional list of containers
+
+    Returns:
+        Estimated vehicle count and ids, fill ratio, and a confidence band
+        (low/high vehicle count and fill ratio).
     """
-    container = algorithm_output["containers"][0]
-    container_length = container["dimensions_mm"]["length"]
-    container_width = container["dimensions_mm"]["width"]
-    container_height = container["dimensions_mm"]["height"]
-
-    # Container offsets for centering in UI
-    offset_x = -container_length / 2
-    offset_z = -container_width / 2
-    container_center_y = container_height / 2
-
-    ui_output = {
-        "container": {
-            "size": {
-                "length": container_length,
-                "height": container_height,
-                "width": container_width,
-            },
-            "position": {"x": 0, "y": container_center_y, "z": 0},
-            "maxWeight": container["max_weight_kg"],
-            "color": "#95a5a6",
-        },
-        "packages": [],
+    return estimate_orders(order_ids, available_containers=available_containers)
+
+
+def estimate_orders(
+    order_ids: List[int],
+    products: Optional[List[Dict]] = None,
+    available_containers: Optional[List[Dict]] = None,
+) -> Dict[str, Any]:
+    """estimate_fleet for a batch of orders, as the batch tool would pack it.
+
+    products (the fetch_multiple_order_details shape) may be passed in to
+    skip the Order API.
+    """
+    if products is None:
+        products = fetch_multiple_order_details(order_ids)["products"]
+    containers = available_containers or fetch_available_vehicles()
+    estimate = estimate_fleet(
+        prepare_commodities_batch(products),
+        containers,
+        PackingOptions(fleet_search="assign"),
+    )
+    return {"order_ids": order_ids, **estimate}
+
+
+@tool
+def add_order_to_layout(
+    layout_key: str,
+    order_id: int,
+    available_containers: Optional[List[Dict]] = None,
+) -> Dict[str, Any]:
+    """Add a late order to an existing layout without repacking it.
+
+    The new order's items are packed into the space left around the boxes
+    already placed, in the first vehicle of the layout that takes the whole
+    order. Only if no vehicle does is the whole load repacked.
+
+    Args:
+        layout_key: S3 key (or local path) of the existing layout
+        order_id: Order ID to add
+        available_containers: Optional list of containers for a full repack
+
+    Returns:
+        Summary with the new S3 key, package counts and the mode used
+        ("incremental" or "full_repack").
+    """
+    # 1. Load the existing layout with all of its vehicles
+    ui_layout = load_layout(layout_key)
+    batch_id = ui_layout.get("batch_id") or layout_name(layout_key)
+    order_ids = list(ui_layout.get("order_ids", []))
+    single_order = re.fullmatch(r"order-(\d+)", batch_id)
+    if not order_ids and single_order:
+        # Single-order layouts carry their order only in the key
+        order_ids = [int(single_order.group(1))]
+    if order_id in order_ids:
+        return {"error": f"Order {order_id} is already in layout {layout_key}"}
+
+    # 2. Prepare the new order's items (labels stay unique through the order id)
+    batch_data = fetch_multiple_order_details([order_id])
+    commodities = prepare_commodities_batch(batch_data["products"])
+
+    # 3. Pack only the new items around the existing ones, in the first
+    # vehicle that takes the whole order. The height map scores a nearly full
+    # container in one pass per orientation, so this stays in the
+    # milliseconds where a grid search would scan every box.
+    mode = "full_repack"
+    for vehicle in ui_layout["containers"]:
+        container, placements = layout_to_placements(vehicle)
+        new_placements, leftover = pack_items_in_container(
+            container,
+            expand_runs(build_items(commodities)),
+            PackingOptions(engine="heightmap"),
+            existing_placements=placements,
+        )
+        if leftover:
+            continue
+        combined = placements.copy()
+        combined.extend(new_placements)
+        if validate_packing(combined, container):
+            continue
+
+        mode = "incremental"
+        # Products already in the layout keep their colors
+        color_map = {
+            pkg.get("product", pkg.get("label")): pkg["color"]
+            for v in ui_layout["containers"]
+            for pkg in v["packages"]
+            if "color" in pkg
+        }
+        added = transform_to_ui_format(
+            {"containers": [container_result(container, new_placements)]},
+            color_map=color_map,
+        )["containers"][0]["packages"]
+        vehicle["packages"].extend(added)
+        break
+
+    if mode == "full_repack":
+        # 4. Fall back to repacking the existing load together with the new order
+        containers = available_containers or fetch_available_vehicles()
+        algorithm_output = choose_containers_and_pack(
+            [c for v in ui_layout["containers"] for c in layout_to_commodities(v)]
+            + commodities,
+            containers,
+            PackingOptions(
+                fleet_search="assign", tiling=tiling_library() is not None
+            ),
+            cache=layout_cache,
+            time_budget_s=PACKING_TIME_BUDGET_S,
+        )
+        repacked = transform_to_ui_format(algorithm_output)
+        ui_layout["containers"] = repacked["containers"]
+
+    order_ids.append(order_id)
+    ui_layout["batch_id"] = batch_id
+    ui_layout["order_ids"] = order_ids
+
+    s3_key = save_layout_to_s3(batch_id, ui_layout, is_batch=True)
+
+    totals = layout_totals(ui_layout)
+    return {
+        "batch_id": batch_id,
+        "order_ids": order_ids,
+        "mode": mode,
+        "previous_s3_key": layout_key,
+        "s3_key": s3_key,
+        "added_packages": sum(c.get("quantity", 1) for c in commodities),
+        "total_packages": totals["total_packages"],
+        "containers_used": totals["containers_used"],
+        "container_id": totals["container_id"],
     }
 
-    colors = ["#c0392b", "#2980b9", "#27ae60", "#d68910", "#8e44ad", "#16a085"]
-    color_map = {}
-    item_counter = {}
-    color_idx = 0
 
-    for placement in container["placements"]:
-        name = placement["item_name"]
-        item_counter[name] = item_counter.get(name, 0) + 1
+def transform_to_ui_format(
+    algorithm_output: Dict[str, Any], color_map: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """Transform algorithm output to UI-compatible format.
 
-        # Assign consistent color per product name
-        if name not in color_map:
-            color_map[name] = colors[color_idx % len(colors)]
-            color_idx += 1
+    Every packed container becomes one vehicle layout (its container and
+    packages, the shape the viewer renders), listed under "containers".
+    Colors and package ids are kept consistent across the vehicles.
 
-        package = {
-            "id": f"{name.lower().replace(' ', '-')}-{item_counter[name]}",
-            "position": {
-                "x": placement["position_mm"][0] + offset_x,
-                "y": placement["position_mm"][2],
-                "z": placement["position_mm"][1] + offset_z,
-            },
-            "size": {
-                "length": placement["dimensions_mm"][0],
-                "height": placement["dimensions_mm"][2],
-                "width": placement["dimensions_mm"][1],
+    This is where units get names of their own: a unit of an order is
+    labelled "<product>-order<order_id>-item<n>", numbered within its order,
+    and carries its order_id; other units keep the product name. Weights
+    come from the placements.
+
+    Args:
+        algorithm_output: Output from packing algorithm
+        color_map: Colors of products already shown (e.g. in the layout new
+            packages join); other products take the next colors
+    """
+    colors = ["#c0392b", "#2980b9", "#27ae60", "#d68910", "#8e44ad", "#16a085"]
+    color_map = dict(color_map or {})
+    item_counter = {}
+    order_counter = {}
+    color_idx = len(color_map)
+
+    ui_output = {"containers": []}
+    for container in algorithm_output["containers"]:
+        container_length = container["dimensions_mm"]["length"]
+        container_width = container["dimensions_mm"]["width"]
+        container_height = container["dimensions_mm"]["height"]
+
+        # Container offsets for centering in UI
+        offset_x = -container_length / 2
+        offset_z = -container_width / 2
+        container_center_y = container_height / 2
+
+        vehicle = {
+            "container": {
+                "id": container.get("id"),
+                "size": {
+                    "length": container_length,
+                    "height": container_height,
+                    "width": container_width,
+                },
+                "position": {"x": 0, "y": container_center_y, "z": 0},
+                "maxWeight": container["max_weight_kg"],
+                "color": "#95a5a6",
             },
-            "weight": weight_map.get(name, 0),
-            "color": color_map[name],
-            "label": name,
-            "placementOrder": placement.get("placement_order", item_counter[name]),
-            "fragile": placement.get("fragile", False),
+            "packages": [],
         }
 
-        # Add order_id if batch processing
-        if item_order_map and name in item_order_map:
-            package["order_id"] = item_order_map[name]
+        # Placements leave the engine's column storage here
+        for placement in container["placements"].to_dicts():
+            name = placement["item_name"]
+            order_id = placement["order_id"]
+
+            label = name
+            if order_id is not None:
+                order_counter[order_id] = order_counter.get(order_id, 0) + 1
+                label = f"{name}-order{order_id}-item{order_counter[order_id]}"
+            item_counter[label] = item_counter.get(label, 0) + 1
+
+            # Assign consistent color per product name
+            if name not in color_map:
+                color_map[name] = colors[color_idx % len(colors)]
+                color_idx += 1
+
+            package = {
+                "id": f"{label.lower().replace(' ', '-')}-{item_counter[label]}",
+                "position": {
+                    "x": placement["position_mm"][0] + offset_x,
+                    "y": placement["position_mm"][2],
+                    "z": placement["position_mm"][1] + offset_z,
+                },
+                "size": {
+                    "length": placement["dimensions_mm"][0],
+                    "height": placement["dimensions_mm"][2],
+                    "width": placement["dimensions_mm"][1],
+                },
+                "weight": placement["weight_kg"],
+                "color": color_map[name],
+                "label": label,
+                "product": name,
+                "placementOrder": placement.get("placement_order", item_counter[label]),
+                "fragile": placement.get("fragile", False),
+                "orientation": placement.get("orientation", "lwh"),
+            }
+
+            # Add order_id if batch processing
+            if order_id is not None:
+                package["order_id"] = order_id
+
+            vehicle["packages"].append(package)
 
-        ui_output["packages"].append(package)
+        ui_output["containers"].append(vehicle)
 
     return ui_output
 
 
+def layout_totals(ui_layout: Dict[str, Any]) -> Dict[str, Any]:
+    """Vehicle count, package count and first vehicle size of a UI layout."""
+    vehicles = ui_layout["containers"]
+    return {
+        "containers_used": len(vehicles),
+        "total_packages": sum(len(v["packages"]) for v in vehicles),
+        "container_id": vehicles[0]["container"]["size"] if vehicles else None,
+    }
+
+
 # Create Analyser Agent
 model = BedrockModel(
     model_id="us.amazon.nova-premier-v1:0",
@@ -853,6 +1287,8 @@ agent = Agent(
         calculate_load_requirements,
         generate_packing_layout,
         generate_batch_packing_layout,
+        estimate_packing,
+        add_order_to_layout,
     ],
     system_prompt="""You are a logistics load planning expert.
 
@@ -863,6 +1299,11 @@ BATCH WORKFLOW:
    - Tags items with order_id for traceability
    - Generates consolidated layout
    - Saves to S3 with batch_id
+   - For a late order joining an already packed batch, use
+     add_order_to_layout(layout_key, order_id) with the batch's s3_key instead
+     of re-running the whole batch
+   - To size a batch before packing it, use estimate_packing(order_ids): vehicle
+     count, fill ratio and confidence band in milliseconds, without S3
 
 2. CRITICAL: Return EXACT output with ALL 8 fields:
    - batch_id (string)
@@ -892,6 +1333,16 @@ RETURN FORMAT (ALL 8 FIELDS):
 @app.entrypoint
 def invoke(payload):
     """Process order analysis requests and return JSON-serializable response."""
+    if "estimate" in payload:
+        # Capacity estimates are asked for in bulk, so they skip the model:
+        # {"estimate": {"order_ids": [...], "products": [...], "vehicles": [...]}}
+        request = payload["estimate"]
+        return estimate_orders(
+            request.get("order_ids", []),
+            products=request.get("products"),
+            available_containers=request.get("vehicles"),
+        )
+
     user_message = payload.get("prompt", "")
 
     if not user_message:
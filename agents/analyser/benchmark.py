@@ -0,0 +1,263 @@
+"""
+Packing engine benchmark
+Measures how choose_containers_and_pack, find_best_position and
+validate_packing scale on synthetic batches, and compares the numbers
+against a stored baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agent import choose_containers_and_pack, prepare_commodities_batch
+from packing import (
+    ENGINE_VERSION,
+    PackingContainer,
+    PackingItem,
+    PlacementIndex,
+    container_volume,
+    find_best_position,
+    validate_packing,
+)
+from profiles import PackingProfile, profiling
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+NOISE_FLOOR_S = 0.05  # slowdowns below this are timer noise
+
+# Vehicles from the transport seed data (transport_api/prisma/seed.js)
+VEHICLES = [
+    {
+        "id": vehicle_id,
+        "length_mm": length,
+        "width_mm": width,
+        "height_mm": height,
+        "max_weight_kg": max_weight,
+    }
+    for vehicle_id, length, width, height, max_weight in [
+        ("tata-ace", 2130, 1320, 1680, 750),
+        ("bolero-pickup", 3050, 1750, 1800, 1250),
+        ("tata-407", 4570, 1980, 2130, 2500),
+        ("leyland-dost", 2440, 1520, 1830, 1000),
+        ("eicher-pro", 5490, 2130, 2440, 4500),
+        ("tata-lpt-1613", 6100, 2440, 2740, 9000),
+    ]
+]
+
+# Product mixes: (number of SKUs, fragile share, weight choices in kg)
+MIXES = {
+    "mixed": (12, 0.25, [2, 5, 10, 20, 40]),
+    "fragile": (8, 0.8, [1, 2, 5]),
+    "heavy": (8, 0.0, [40, 60, 80]),
+    "uniform": (1, 0.0, [10]),
+}
+
+
+def make_catalog(mix: str, seed: int):
+    """Synthetic products in the Order API shape, sizes in 50 mm steps."""
+    skus, fragile_share, weights = MIXES[mix]
+    rnd = random.Random(seed)
+    return [
+        {
+            "label": f"{mix.upper()}-{k}",
+            "length": rnd.choice([200, 300, 400, 500, 600]),
+            "width": rnd.choice([200, 250, 300, 400]),
+            "height": rnd.choice([150, 200, 300, 400]),
+            "weight": rnd.choice(weights),
+            "fragility": rnd.random() < fragile_share,
+        }
+        for k in range(skus)
+    ]
+
+
+def make_batch(mix: str, units: int, seed: int = 42):
+    """Orders of 1-3 catalog products until the batch holds `units` units."""
+    catalog = make_catalog(mix, seed)
+    rnd = random.Random(seed + units)
+    products, order_id, remaining = [], 0, units
+    while remaining:
+        order_id += 1
+        for product in rnd.sample(catalog, min(len(catalog), rnd.randint(1, 3))):
+            quantity = min(remaining, rnd.randint(1, 60))
+            products.append(
+                {"order_id": order_id, "quantity": quantity, "product": product}
+            )
+            remaining -= quantity
+            if not remaining:
+                break
+    return products
+
+
+def run_case(mix: str, units: int):
+    """Pack one synthetic batch and collect its metrics.
+
+    Runs in a fresh worker process so peak memory belongs to this case only.
+    """
+    commodities = prepare_commodities_batch(make_batch(mix, units))
+
+    # Warm up lazy imports before anything is timed
+    choose_containers_and_pack(commodities[:1], VEHICLES)
+
+    # Candidates are the position × orientation pairs the engine generates
+    with profiling(PackingProfile()) as profile:
+        start = time.perf_counter()
+        result = choose_containers_and_pack(commodities, VEHICLES)
+        pack_s = time.perf_counter() - start
+
+    vehicles = {v["id"]: PackingContainer(**v) for v in VEHICLES}
+    packed = [(vehicles[c["id"]], c["placements"]) for c in result["containers"]]
+
+    start = time.perf_counter()
+    for container, placements in packed:
+        validate_packing(placements, container)
+    validate_s = time.perf_counter() - start
+
+    used_volume = sum(container_volume(c) for c, _ in packed)
+    packed_volume = sum(placements.volume() for _, placements in packed)
+
+    return {
+        "units": units,
+        "mix": mix,
+        "wall_s": round(pack_s, 4),
+        "candidates": profile.counters.get("candidates", 0),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "vehicles": len(packed),
+        "unplaced": len(result.get("unplaced_items", [])),
+        "fill_ratio": round(packed_volume / used_volume, 4) if used_volume else 0.0,
+        "validate_s": round(validate_s, 4),
+        "lookup_ms": round(time_lookup(packed) * 1000, 3),
+    }
+
+
+def time_lookup(packed, repeats: int = 3):
+    """Average time of one position search in the fullest container."""
+    if not packed:
+        return 0.0
+    container, placements = max(packed, key=lambda run: len(run[1]))
+    probe = PackingItem("PROBE", 400, 300, 300, 5)
+    index = PlacementIndex(placements)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        find_best_position(probe, container, index, 0.0, container.height_mm, False)
+    return (time.perf_counter() - start) / repeats
+
+
+def compare(results, baseline, tolerance: float):
+    """Regressions against the baseline, one message per metric."""
+    regressions = []
+    for key, run in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if run["wall_s"] > base["wall_s"] * (1 + tolerance) + NOISE_FLOOR_S:
+            regressions.append(
+                f"{key}: wall time {run['wall_s']:.3f}s vs {base['wall_s']:.3f}s"
+            )
+        if run["candidates"] > base["candidates"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: {run['candidates']} candidates vs {base['candidates']}"
+            )
+        if run["vehicles"] > base["vehicles"] or run["unplaced"] > base["unplaced"]:
+            regressions.append(
+                f"{key}: {run['vehicles']} vehicles / {run['unplaced']} unplaced"
+                f" vs {base['vehicles']} / {base['unplaced']}"
+            )
+        if run["fill_ratio"] < base["fill_ratio"] - 0.01:
+            regressions.append(
+                f"{key}: fill {run['fill_ratio']:.1%} vs {base['fill_ratio']:.1%}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--counts",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 5000],
+        help="Unit counts to pack",
+    )
+    parser.add_argument(
+        "--mixes",
+        nargs="+",
+        choices=sorted(MIXES),
+        default=sorted(MIXES),
+        help="Product mixes to pack",
+    )
+    parser.add_argument(
+        "--baseline", default=BASELINE_PATH, help="Baseline JSON to compare with"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write these results as the new baseline",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown before a run counts as a regression",
+    )
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored["cases"]
+        if stored.get("engine_version") != ENGINE_VERSION:
+            print(
+                f"WARNING baseline recorded with engine version"
+                f" {stored.get('engine_version')}, running {ENGINE_VERSION};"
+                " re-record it with --save-baseline"
+            )
+
+    print(
+        f"{'case':>14} {'pack_s':>8} {'base_s':>8} {'candidates':>11}"
+        f" {'rss_mb':>7} {'veh':>4} {'left':>5} {'fill':>6}"
+        f" {'valid_s':>8} {'lookup_ms':>10}"
+    )
+    results = {}
+    for mix in args.mixes:
+        for count in args.counts:
+            # A pool of its own per case, so peak memory is not carried over
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                run = pool.submit(run_case, mix, count).result()
+            key = f"{mix}-{count}"
+            results[key] = run
+            base_s = baseline.get(key, {}).get("wall_s")
+            print(
+                f"{key:>14} {run['wall_s']:>8.3f}"
+                f" {base_s if base_s is not None else float('nan'):>8.3f}"
+                f" {run['candidates']:>11} {run['peak_rss_mb']:>7.1f}"
+                f" {run['vehicles']:>4} {run['unplaced']:>5}"
+                f" {run['fill_ratio']:>6.1%} {run['validate_s']:>8.3f}"
+                f" {run['lookup_ms']:>10.2f}"
+            )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {"engine_version": ENGINE_VERSION, "cases": results},
+                f,
+                indent=2,
+            )
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
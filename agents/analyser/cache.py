@@ -0,0 +1,229 @@
+"""
+Layout cache
+Packing results by load signature, stored by slot so a hit can be replayed
+for any load with the same signature
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict, deque
+from dataclasses import asdict, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+from packing import (
+    ENGINE_VERSION,
+    PALLET_NAME,
+    ItemRun,
+    PackingItem,
+    PlacementTable,
+    expand_runs,
+    item_key,
+    tiling_library,
+)
+
+s3_client = boto3.client("s3")
+
+logger = logging.getLogger(__name__)
+
+S3_BUCKET = os.getenv("S3_LAYOUTS_BUCKET", "logistics-packing-layouts")
+LAYOUT_CACHE_SIZE = int(os.getenv("LAYOUT_CACHE_SIZE", "128"))
+LAYOUT_CACHE_DIR = os.getenv("LAYOUT_CACHE_DIR")  # optional on-disk tier
+LAYOUT_CACHE_S3_PREFIX = os.getenv("LAYOUT_CACHE_S3_PREFIX")  # optional S3 tier
+
+
+def load_signature(runs, container_objs, options) -> str:
+    """Canonical hash of a packing problem (a load of ItemRuns).
+
+    Item names and order ids do not matter: the load is the sorted multiset
+    of (dims, weight, fragile, upright) of each order, plus the vehicles, the
+    packing options and the engine version (and, with tiling, the library).
+    """
+    problem = {
+        "items": [
+            [[list(k), n] for k, n in order_contents(group)]
+            for group in canonical_orders(runs)
+        ],
+        "containers": [
+            [c.length_mm, c.width_mm, c.height_mm, c.max_weight_kg]
+            for c in container_objs
+        ],
+        "options": asdict(replace(options, deadline=None, profile=False)),
+        "engine": ENGINE_VERSION,
+    }
+    if options.tiling and tiling_library() is not None:
+        problem["tiling"] = tiling_library().digest
+    encoded = json.dumps(problem, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def order_contents(group: List[ItemRun]) -> List[Tuple[Tuple, int]]:
+    """(item key, units) of an order's sorted runs, one entry per key."""
+    contents: List[Tuple[Tuple, int]] = []
+    for run in group:
+        key = item_key(run.item)
+        if contents and contents[-1][0] == key:
+            contents[-1] = (key, contents[-1][1] + run.quantity)
+        else:
+            contents.append((key, run.quantity))
+    return contents
+
+
+def canonical_orders(runs) -> List[List[ItemRun]]:
+    """Runs sorted within their order, and orders sorted by their contents."""
+    by_order: Dict[Any, List[ItemRun]] = {}
+    for run in runs:
+        by_order.setdefault(run.item.order_id, []).append(run)
+    groups = [
+        sorted(group, key=lambda r: item_key(r.item)) for group in by_order.values()
+    ]
+    return sorted(groups, key=order_contents)
+
+
+def canonical_items(runs) -> List[PackingItem]:
+    """Units in signature order, so equal loads line up slot by slot.
+
+    Slots follow the orders, so a replayed layout keeps every order on the
+    vehicles it was packed into.
+    """
+    return [unit for group in canonical_orders(runs) for unit in expand_runs(group)]
+
+
+def strip_layout(results, unplaced, runs, container_objs) -> Dict[str, Any]:
+    """Packing results with names, order ids and vehicle ids replaced by slots.
+
+    runs are the load as ItemRuns, unplaced the units left out of the
+    results. Pallet decks are no input item; they keep their name and get no
+    slot.
+    """
+    slots: Dict[Tuple, deque] = {}
+    for slot, item in enumerate(canonical_items(runs)):
+        slots.setdefault((item.name, item.order_id), deque()).append(slot)
+    vehicle_slot = {c.id: k for k, c in enumerate(container_objs)}
+
+    containers = []
+    for ct in results["containers"]:
+        placements = []
+        for p in ct["placements"].to_dicts():
+            if p["item_name"] == PALLET_NAME and p["order_id"] is None:
+                placements.append(dict(p, slot=None))
+                continue
+            stored = {
+                k: v for k, v in p.items() if k not in ("item_name", "order_id")
+            }
+            stored["slot"] = slots[p["item_name"], p["order_id"]].popleft()
+            placements.append(stored)
+        containers.append(
+            {"vehicle": vehicle_slot[ct["id"]], "placements": placements}
+        )
+    return {
+        "containers": containers,
+        "unplaced": [slots[i.name, i.order_id].popleft() for i in unplaced],
+    }
+
+
+def restore_layout(stored, runs, container_objs) -> Tuple[List, List]:
+    """Map a stored layout onto this request's load (ItemRuns) and vehicles.
+
+    Returns the same ([(container, placements)], unplaced_items) as
+    pack_into_fleet.
+    """
+    ordered = canonical_items(runs)
+    packed = []
+    for ct in stored["containers"]:
+        placements = []
+        for p in ct["placements"]:
+            placement = {}
+            if p["slot"] is not None:
+                item = ordered[p["slot"]]
+                placement = {"item_name": item.name, "order_id": item.order_id}
+            placement.update((k, v) for k, v in p.items() if k != "slot")
+            placements.append(placement)
+        packed.append(
+            (container_objs[ct["vehicle"]], PlacementTable.from_dicts(placements))
+        )
+    return packed, [ordered[slot] for slot in stored["unplaced"]]
+
+
+class LayoutCache:
+    """Packing results by load signature: in-process LRU, then disk, then S3.
+
+    The disk and S3 tiers are only used when a directory or key prefix is set.
+    Layouts are stored by slot, so a hit can be replayed for any items and
+    vehicles with the same signature.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LAYOUT_CACHE_SIZE,
+        directory: Optional[str] = LAYOUT_CACHE_DIR,
+        s3_prefix: Optional[str] = LAYOUT_CACHE_S3_PREFIX,
+    ):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.s3_prefix = s3_prefix
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _remember(self, key: str, encoded: str):
+        self._entries[key] = encoded
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        encoded = self._entries.get(key)
+        if encoded is not None:
+            self._entries.move_to_end(key)
+        if encoded is None and self.directory:
+            path = os.path.join(self.directory, f"{key}.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    encoded = f.read()
+        if encoded is None and self.s3_prefix:
+            try:
+                response = s3_client.get_object(
+                    Bucket=S3_BUCKET, Key=f"{self.s3_prefix}/{key}.json"
+                )
+                encoded = response["Body"].read().decode()
+            except s3_client.exceptions.NoSuchKey:
+                pass
+            except (BotoCoreError, ClientError) as e:
+                # The cache never fails a packing run; an unreadable entry is a miss
+                logger.warning(f"Layout cache read of {key} failed: {e}")
+
+        if encoded is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, encoded)
+        return json.loads(encoded)
+
+    def put(self, key: str, stored: Dict[str, Any]):
+        encoded = json.dumps(stored, separators=(",", ":"))
+        self._remember(key, encoded)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{key}.json"), "w") as f:
+                f.write(encoded)
+        if self.s3_prefix:
+            try:
+                s3_client.put_object(
+                    Bucket=S3_BUCKET,
+                    Key=f"{self.s3_prefix}/{key}.json",
+                    Body=encoded,
+                    ContentType="application/json",
+                )
+            except (BotoCoreError, ClientError) as e:
+                logger.warning(f"Layout cache write of {key} failed: {e}")
+
+
+layout_cache = LayoutCache()
@@ -0,0 +1,602 @@
+"""
+Fleet packing
+Bounds of a load against a fleet, the fill and search over several vehicles,
+order assignment, and vehicle estimates from bounds alone
+"""
+
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from packing import (
+    ItemRun,
+    PackingContainer,
+    PackingItem,
+    PackingOptions,
+    container_volume,
+    expand_runs,
+    fitting_orientations,
+    item_key,
+    item_orientations,
+    item_runs,
+    pack_items_in_container,
+    tiling_library,
+)
+from profiles import pool_map
+
+
+# ==================== LOWER BOUNDS ====================
+
+
+class ContainerBounds(NamedTuple):
+    """Lower bounds of one container type for a whole load."""
+
+    by_volume: float  # containers needed for the load's volume alone
+    by_weight: float  # containers needed for the load's weight alone
+    fitting_units: int  # units that fit the empty container at all
+
+
+def needed(total: float, capacity: float) -> float:
+    """Continuous bound: containers of a capacity needed for a total."""
+    if total <= 0:
+        return 0
+    return math.ceil(total / capacity) if capacity > 0 else math.inf
+
+
+def unit_fits(item, container, options) -> bool:
+    """Per-dimension and weight bound of one unit against an empty container."""
+    return (
+        bool(item_orientations(item, container, options))
+        and item.weight_kg <= container.max_weight_kg
+    )
+
+
+def container_bounds(runs, container, options) -> ContainerBounds:
+    """Volume and weight bounds of a load (ItemRuns) for one container type."""
+    fits: Dict[Tuple, bool] = {}
+    fitting = 0
+    for run in runs:
+        key = item_key(run.item)
+        if key not in fits:
+            fits[key] = unit_fits(run.item, container, options)
+        fitting += fits[key] * run.quantity
+    return ContainerBounds(
+        by_volume=needed(sum(r.volume() for r in runs), container_volume(container)),
+        by_weight=needed(sum(r.weight_kg() for r in runs), container.max_weight_kg),
+        fitting_units=fitting,
+    )
+
+
+def screen_load(runs, container_objs, options):
+    """Drop what the bounds alone rule out, before any search.
+
+    Containers that cannot take a single unit of the load are dropped, and
+    runs of units that fit none of the remaining containers are set aside as
+    unplaced instead of being searched for in every vehicle.
+
+    Returns (containers, runs, unfit_runs, bounds by container id).
+    """
+    bounds = {c.id: container_bounds(runs, c, options) for c in container_objs}
+    containers = [c for c in container_objs if bounds[c.id].fitting_units]
+
+    fits: Dict[Tuple, bool] = {}
+    usable, unfit = [], []
+    for run in runs:
+        key = item_key(run.item)
+        if key not in fits:
+            fits[key] = any(unit_fits(run.item, c, options) for c in containers)
+        (usable if fits[key] else unfit).append(run)
+    return containers, usable, unfit, bounds
+
+
+def vehicle_lower_bound(runs, container_objs) -> float:
+    """Fewest vehicles any packing needs, from the largest volume and payload."""
+    if not runs:
+        return 0
+    if not container_objs:
+        return math.inf
+    return max(
+        needed(
+            sum(r.volume() for r in runs),
+            max(container_volume(c) for c in container_objs),
+        ),
+        needed(
+            sum(r.weight_kg() for r in runs),
+            max(c.max_weight_kg for c in container_objs),
+        ),
+    )
+
+
+def pack_into_fleet(items, container_objs, options=None):
+    """Fill containers in the given order, passing leftovers on to the next one.
+
+    Returns ([(container, placements), ...], unplaced_items).
+    """
+    packed = []
+    current_items = items
+    for container in container_objs:
+        if not current_items:
+            break
+        placements, current_items = pack_items_in_container(
+            container, current_items, options
+        )
+        packed.append((container, placements))
+    return packed, current_items
+
+
+def fleet_score(packed, unplaced, objective) -> Tuple:
+    """Sort key for a fleet result; lower is better."""
+    used_volume = sum(container_volume(c) for c, _ in packed)
+    packed_volume = sum(placements.volume() for _, placements in packed)
+    terms = {
+        "vehicles": len(packed),
+        "volume": used_volume,
+        "utilisation": -(packed_volume / used_volume) if used_volume else 0.0,
+    }
+    unknown = set(objective) - set(terms)
+    if unknown:
+        raise ValueError(f"Unknown packing objective: {sorted(unknown)}")
+    return (len(unplaced),) + tuple(terms[name] for name in objective)
+
+
+def restart_options(options) -> List[PackingOptions]:
+    """Seeded perturbations of the packing order and score weights."""
+    rnd = random.Random(options.seed)
+    return [
+        replace(
+            options,
+            restarts=0,
+            order_seed=rnd.getrandbits(32),
+            stacking_bonus=options.stacking_bonus * rnd.uniform(0.5, 1.5),
+            door_penalty=options.door_penalty * rnd.uniform(0.5, 1.5),
+            height_penalty=options.height_penalty * 10 ** rnd.uniform(-1, 1.5),
+        )
+        for _ in range(options.restarts)
+    ]
+
+
+def search_fleet(items, container_objs, options):
+    """Pack the load led by each distinct vehicle in parallel and keep the best.
+
+    Each run starts with one vehicle and passes leftovers on to the others
+    smallest first, so the smallest-first fill is always among the runs.
+    With restarts, every perturbed variant of the options is run against
+    every lead vehicle as well; ties go to the earliest run, so the result
+    only depends on the seed.
+    """
+    sequences, seen = [], set()
+    for lead in container_objs:
+        dims = (lead.length_mm, lead.width_mm, lead.height_mm, lead.max_weight_kg)
+        if dims in seen:
+            continue
+        seen.add(dims)
+        sequences.append([lead] + [c for c in container_objs if c is not lead])
+
+    jobs = [
+        (sequence, variant)
+        for variant in [options] + restart_options(options)
+        for sequence in sequences
+    ]
+    if not jobs:
+        return [], items
+    if len(jobs) == 1:
+        return pack_into_fleet(items, *jobs[0])
+
+    workers = min(len(jobs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        runs = pool_map(
+            pool,
+            pack_into_fleet,
+            [items] * len(jobs),
+            [sequence for sequence, _ in jobs],
+            [variant for _, variant in jobs],
+        )
+    return min(runs, key=lambda run: fleet_score(run[0], run[1], options.objective))
+
+
+# ==================== FLEET ASSIGNMENT ====================
+
+
+@dataclass
+class VehiclePlan:
+    """Orders (lists of ItemRuns) assigned to one vehicle, with their total
+    volume and weight."""
+
+    container: PackingContainer
+    groups: List[List[ItemRun]] = field(default_factory=list)
+    volume: float = 0.0
+    weight: float = 0.0
+
+    def accepts(self, group, fill: float, fits) -> bool:
+        """Whether the group stays within the volume and payload bounds.
+
+        An empty vehicle takes any group up to its full volume, so a large
+        order is not refused by the fill target alone.
+        """
+        volume = sum(r.volume() for r in group)
+        capacity = container_volume(self.container)
+        return (
+            fits(group, self.container)
+            and self.weight + sum(r.weight_kg() for r in group)
+            <= self.container.max_weight_kg
+            and (
+                self.volume + volume <= capacity * fill
+                or not self.groups
+                and volume <= capacity
+            )
+        )
+
+    def add(self, group):
+        self.groups.append(group)
+        self.volume += sum(r.volume() for r in group)
+        self.weight += sum(r.weight_kg() for r in group)
+
+    def remove(self, group):
+        self.groups.remove(group)
+        self.volume -= sum(r.volume() for r in group)
+        self.weight -= sum(r.weight_kg() for r in group)
+
+    def items(self) -> List[PackingItem]:
+        return [unit for group in self.groups for unit in expand_runs(group)]
+
+
+def group_units(group: List[ItemRun]) -> int:
+    return sum(r.quantity for r in group)
+
+
+def order_groups(items, container_objs, fill: float) -> List[List[ItemRun]]:
+    """Runs of units grouped by order, largest order first.
+
+    An order too large for the largest vehicle is cut into pieces that fit it,
+    the only case in which an order is split before packing; a run is split
+    where a piece is full.
+    """
+    by_order: Dict[Any, List[ItemRun]] = {}
+    for run in item_runs(items):
+        by_order.setdefault(run.item.order_id, []).append(run)
+
+    largest = max(container_objs, key=container_volume)
+    volume_cap = container_volume(largest) * fill
+    weight_cap = largest.max_weight_kg
+
+    groups = []
+    for runs in by_order.values():
+        piece, volume, weight = [], 0.0, 0.0
+        for run in sorted(runs, key=lambda r: r.item.volume(), reverse=True):
+            unit, left = run.item, run.quantity
+            unit_volume, unit_weight = unit.volume(), unit.weight_kg
+            while left:
+                if piece and (
+                    volume + unit_volume > volume_cap
+                    or weight + unit_weight > weight_cap
+                ):
+                    groups.append(piece)
+                    piece, volume, weight = [], 0.0, 0.0
+                # As many units as the piece still holds, and at least one
+                take = left
+                if unit_volume > 0:
+                    take = min(take, int((volume_cap - volume) // unit_volume))
+                if unit_weight > 0:
+                    take = min(take, int((weight_cap - weight) // unit_weight))
+                take = max(take, 1)
+                piece.append(ItemRun(unit, take))
+                volume += unit_volume * take
+                weight += unit_weight * take
+                left -= take
+        groups.append(piece)
+    groups.sort(key=lambda g: sum(r.volume() for r in g), reverse=True)
+    return groups
+
+
+def assign_orders(
+    items, container_objs, options, fill: float
+) -> Tuple[List[VehiclePlan], List]:
+    """Distribute whole orders over the vehicles by their volume and weight.
+
+    First-fit decreasing: orders go largest first into the first planned
+    vehicle that still has room below `fill` of its volume, and a new vehicle
+    (the largest one left) is only opened when none has. A local-improvement
+    pass then empties the least loaded vehicles into the others where the
+    bounds allow, and moves every plan to the smallest vehicle that still
+    holds it.
+
+    Returns (plans, unassigned_items).
+    """
+    fit_cache: Dict[Tuple, bool] = {}
+
+    def fits(group, container):
+        for run in group:
+            key = (item_key(run.item), container.id)
+            if key not in fit_cache:
+                fit_cache[key] = unit_fits(run.item, container, options)
+            if not fit_cache[key]:
+                return False
+        return True
+
+    plans: List[VehiclePlan] = []
+    spare = sorted(container_objs, key=container_volume, reverse=True)
+    unassigned = []
+    for group in order_groups(items, container_objs, fill):
+        plan = next((p for p in plans if p.accepts(group, fill, fits)), None)
+        if plan is None:
+            lead = next(
+                (c for c in spare if VehiclePlan(c).accepts(group, fill, fits)), None
+            )
+            if lead is None:
+                unassigned.extend(expand_runs(group))
+                continue
+            spare.remove(lead)
+            plan = VehiclePlan(lead)
+            plans.append(plan)
+        plan.add(group)
+
+    # Empty the least loaded vehicles into the others
+    improved = True
+    while improved and len(plans) > 1:
+        improved = False
+        for plan in sorted(plans, key=lambda p: p.volume):
+            others = [p for p in plans if p is not plan]
+            moves = []
+            for group in sorted(plan.groups, key=group_units, reverse=True):
+                target = next(
+                    (p for p in others if p.accepts(group, fill, fits)), None
+                )
+                if target is None:
+                    break
+                target.add(group)
+                moves.append((target, group))
+            if len(moves) == len(plan.groups):
+                plans.remove(plan)
+                spare.append(plan.container)
+                improved = True
+                break
+            for target, group in moves:
+                target.remove(group)
+
+    # Move each plan to the smallest vehicle that still holds it
+    for plan in sorted(plans, key=lambda p: p.volume, reverse=True):
+        for smaller in sorted(spare, key=container_volume):
+            if container_volume(smaller) >= container_volume(plan.container):
+                break
+            candidate = VehiclePlan(smaller)
+            for group in plan.groups:
+                if not candidate.accepts(group, fill, fits):
+                    break
+                candidate.add(group)
+            else:
+                spare.remove(smaller)
+                spare.append(plan.container)
+                plan.container = smaller
+                break
+
+    return plans, unassigned
+
+
+def fill_room(packed, items, options) -> List[PackingItem]:
+    """Pack items into the room left in loaded vehicles, emptiest first.
+
+    Uses the engine the caller asked for; the placements in packed are
+    extended in place. Returns the items that fit none of the vehicles.
+    """
+    for container, placements in sorted(
+        packed, key=lambda run: run[1].volume() - container_volume(run[0])
+    ):
+        if not items:
+            break
+        added, items = pack_items_in_container(
+            container, items, options, existing_placements=placements
+        )
+        placements.extend(added)
+    return items
+
+
+def assign_fleet(items, container_objs, options):
+    """Assign orders to vehicles, then pack every vehicle in parallel.
+
+    When the fleet cannot hold the load at `assign_fill`, every vehicle is
+    planned full instead. Units that do not fit the vehicle they were
+    assigned to are packed into the room left in the other planned vehicles,
+    then into unused ones.
+
+    Returns ([(container, placements), ...], unplaced_items) like
+    pack_into_fleet.
+    """
+    if not items or not container_objs:
+        return [], items
+    plans, unassigned = assign_orders(
+        items, container_objs, options, options.assign_fill
+    )
+    if unassigned:
+        plans, unassigned = assign_orders(items, container_objs, options, 1.0)
+
+    jobs = [(plan.container, plan.items()) for plan in plans]
+    workers = min(len(jobs), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runs = pool_map(
+                pool,
+                pack_items_in_container,
+                [container for container, _ in jobs],
+                [members for _, members in jobs],
+                [options] * len(jobs),
+            )
+    else:
+        runs = [pack_items_in_container(c, members, options) for c, members in jobs]
+
+    packed, leftover = [], []
+    for (container, _), (placements, rest) in zip(jobs, runs):
+        packed.append((container, placements))
+        leftover.extend(rest)
+
+    leftover = fill_room(packed, leftover, options)
+    used = {id(container) for container, _ in packed}
+    spare = sorted(
+        (c for c in container_objs if id(c) not in used), key=container_volume
+    )
+    extra, leftover = pack_into_fleet(leftover + unassigned, spare, options)
+    packed.extend(run for run in extra if len(run[1]))
+    return [run for run in packed if len(run[1])], leftover
+
+
+# ==================== ESTIMATES ====================
+
+# Share of the layer capacity of its products a load is packed to, typically
+# and at worst by the order assignment search (estimate_fleet; calibrated on the
+# benchmark.py batches)
+ESTIMATE_FILL = 0.9
+ESTIMATE_WORST_FILL = 0.75
+
+
+@lru_cache(maxsize=4096)
+def layer_capacity(length, width, height, upright, rotation, container_dims) -> int:
+    """Units of one product an empty vehicle takes in whole layers.
+
+    The floor-tiling library's pattern if there is one, otherwise the best
+    grid of a single orientation (floor(L/l) × floor(W/w) × floor(H/h)).
+    """
+    library = tiling_library()
+    if library is not None and rotation:
+        pattern = library.lookup(length, width, height, upright, container_dims)
+        if pattern is not None:
+            return pattern.units()
+
+    shapes = fitting_orientations(
+        length, width, height, upright, rotation, container_dims
+    )
+    cl, cw, ch = container_dims
+    return max(
+        (
+            int(cl // o.length_mm) * int(cw // o.width_mm) * int(ch // o.height_mm)
+            for o in shapes
+        ),
+        default=0,
+    )
+
+
+def cover_load(shares: Dict[str, float], fleet) -> Tuple[List, float]:
+    """Vehicles to cover a load, given the share of it each vehicle holds.
+
+    Largest vehicles first; the last one is swapped for the smallest unused
+    vehicle that still holds the rest. Returns (vehicles, share left over).
+    """
+    chosen, rest = [], 1.0
+    free = list(fleet)  # largest first
+    while rest > 1e-9 and free:
+        holding = [c for c in free if shares[c.id] >= rest - 1e-9]
+        if holding:
+            chosen.append(min(holding, key=container_volume))
+            return chosen, 0.0
+        vehicle = max(free, key=lambda c: shares[c.id])
+        if shares[vehicle.id] <= 0:
+            break
+        chosen.append(vehicle)
+        free.remove(vehicle)
+        rest -= shares[vehicle.id]
+    return chosen, max(rest, 0.0)
+
+
+def estimate_fleet(commodities, containers, options=None) -> Dict[str, Any]:
+    """Vehicle count and fill of a load from bounds alone, without packing.
+
+    Each vehicle is rated by the share of the load it could hold, from
+    three demands per commodity run: its volume, its weight and its layer
+    heuristic (quantity over layer_capacity, the units of that product the
+    empty vehicle takes). Units that fit no vehicle are set aside, as in
+    screen_load. cover_load then picks vehicles for:
+
+    - low: volume and weight alone, a bound no packing can beat
+    - estimate: the layer heuristic at ESTIMATE_FILL, and weight
+    - high: the layer heuristic at ESTIMATE_WORST_FILL, and weight
+
+    Runs in O(runs × vehicles) and never searches positions, so it can be
+    called for every candidate batch of a planning cycle.
+    """
+    started = time.perf_counter()
+    options = options or PackingOptions()
+    fleet = sorted(
+        [PackingContainer(**ct) for ct in containers],
+        key=container_volume,
+        reverse=True,
+    )
+
+    demand = {
+        c.id: {"volume": 0.0, "weight": 0.0, "layers": 0.0} for c in fleet
+    }
+    total_volume = total_weight = 0.0
+    units = unfit = 0
+    for run in commodities:
+        unit = PackingItem(
+            name=run["name"],
+            length_mm=run["length_mm"],
+            width_mm=run["width_mm"],
+            height_mm=run["height_mm"],
+            weight_kg=run["weight_kg"],
+            fragile=bool(run.get("fragile", False)),
+            upright=bool(run.get("upright", False)),
+        )
+        quantity = int(run.get("quantity", 1))
+        units += quantity
+
+        fitting = [c for c in fleet if unit_fits(unit, c, options)]
+        if not fitting:
+            unfit += quantity
+            continue
+        total_volume += unit.volume() * quantity
+        total_weight += unit.weight_kg * quantity
+        for c in fitting:
+            capacity = layer_capacity(
+                unit.length_mm,
+                unit.width_mm,
+                unit.height_mm,
+                unit.keeps_upright(),
+                options.rotation,
+                (c.length_mm, c.width_mm, c.height_mm),
+            )
+            d = demand[c.id]
+            d["volume"] += unit.volume() * quantity / container_volume(c)
+            d["weight"] += unit.weight_kg * quantity / c.max_weight_kg
+            d["layers"] += quantity / capacity
+
+    def share(c, kind: str, fill: float = 1.0) -> float:
+        """Share of the load vehicle c holds, by one demand and by weight."""
+        need = max(demand[c.id][kind] / fill, demand[c.id]["weight"])
+        return 1.0 / need if need > 0 else math.inf
+
+    scenarios = {
+        "low": {c.id: share(c, "volume") for c in fleet},
+        "estimate": {c.id: share(c, "layers", ESTIMATE_FILL) for c in fleet},
+        "high": {c.id: share(c, "layers", ESTIMATE_WORST_FILL) for c in fleet},
+    }
+
+    counts, fills, overflow, vehicle_ids = {}, {}, 0.0, []
+    for name, shares in scenarios.items():
+        chosen, rest = cover_load(shares, fleet) if total_volume else ([], 0.0)
+        counts[name] = len(chosen)
+        used = sum(container_volume(c) for c in chosen)
+        fills[name] = round(total_volume * (1 - rest) / used, 4) if used else 0.0
+        if name == "estimate":
+            overflow, vehicle_ids = rest, [c.id for c in chosen]
+
+    return {
+        "vehicles": counts["estimate"],
+        "vehicle_ids": vehicle_ids,
+        "fill_ratio": fills["estimate"],
+        "confidence_band": {
+            "vehicles": [counts["low"], max(counts["high"], counts["estimate"])],
+            "fill_ratio": [
+                min(fills["high"], fills["estimate"]),
+                max(fills["low"], fills["estimate"]),
+            ],
+        },
+        "total_units": units,
+        "total_volume_m3": round(total_volume / 1_000_000_000, 3),
+        "total_weight_kg": round(total_weight, 2),
+        "unfit_units": unfit,
+        "overflow_share": round(overflow, 4),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
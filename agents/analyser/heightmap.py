@@ -0,0 +1,191 @@
+"""
+Height-map packing engine
+Keeps the container floor as a grid of stack heights so every candidate
+position of an item is scored in one vectorized pass
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _slide(grid: np.ndarray, k: int, axis: int, op) -> np.ndarray:
+    """Fold `op` over every run of k consecutive cells along one axis."""
+    n = grid.shape[axis] - k + 1
+    window = [slice(None), slice(None)]
+    window[axis] = slice(0, n)
+    out = grid[tuple(window)].copy()
+    for shift in range(1, k):
+        window[axis] = slice(shift, shift + n)
+        op(out, grid[tuple(window)], out=out)
+    return out
+
+
+def window_max(grid: np.ndarray, kx: int, ky: int) -> np.ndarray:
+    """Maximum over every kx × ky window, computed one axis at a time."""
+    return _slide(_slide(grid, kx, 0, np.maximum), ky, 1, np.maximum)
+
+
+def window_min(grid: np.ndarray, kx: int, ky: int) -> np.ndarray:
+    """Minimum over every kx × ky window, computed one axis at a time."""
+    return _slide(_slide(grid, kx, 0, np.minimum), ky, 1, np.minimum)
+
+
+def window_sum(mask: np.ndarray, kx: int, ky: int) -> np.ndarray:
+    """Number of set cells in every kx × ky window, via 2D prefix sums."""
+    prefix = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int32)
+    prefix[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+    return (
+        prefix[kx:, ky:]
+        - prefix[:-kx, ky:]
+        - prefix[kx:, :-ky]
+        + prefix[:-kx, :-ky]
+    )
+
+
+def count_at_level(
+    grid: np.ndarray, kx: int, ky: int, rows, cols, levels
+) -> np.ndarray:
+    """Cells equal to levels[n] in the kx × ky window at (rows[n], cols[n])."""
+    windows = sliding_window_view(grid, (kx, ky))[rows, cols]
+    return (windows == levels[:, None, None]).sum(axis=(1, 2))
+
+
+class HeightMap:
+    """Stack heights of a container floor at a fixed cell resolution.
+
+    Existing boxes are read from a PlacementTable (anything with box(row)).
+
+    Two grids are kept per cell:
+    - top: highest surface touching the cell, used for placement height and
+      collisions (rounded outwards, so it never under-reports)
+    - solid: highest surface covering the whole cell, used for support
+      (rounded inwards, so it never over-reports)
+    """
+
+    def __init__(
+        self,
+        container,
+        resolution_mm: float = 50.0,
+        placements=None,
+        scoring: Tuple[float, float, float] = (100.0, 50.0, 0.001),
+    ):
+        self.container = container
+        self.res = float(resolution_mm)
+        # Stacking bonus, door penalty and penalty per mm of height
+        self.stacking_bonus, self.door_penalty, self.height_penalty = scoring
+        shape = (
+            int(np.ceil(container.length_mm / self.res)),
+            int(np.ceil(container.width_mm / self.res)),
+        )
+        self.top = np.zeros(shape)
+        self.solid = np.zeros(shape)
+        if placements is not None:
+            for row in range(len(placements)):
+                self.add(*placements.box(row))
+
+    def add(self, x, y, z, length, width, height):
+        """Raise the floor under a placed box to its top surface."""
+        surface = z + height
+        r = self.res
+
+        x0, x1 = int(x // r), int(np.ceil((x + length) / r))
+        y0, y1 = int(y // r), int(np.ceil((y + width) / r))
+        np.maximum(self.top[x0:x1, y0:y1], surface, out=self.top[x0:x1, y0:y1])
+
+        x0, x1 = int(np.ceil(x / r)), int((x + length) // r)
+        y0, y1 = int(np.ceil(y / r)), int((y + width) // r)
+        if x0 < x1 and y0 < y1:
+            np.maximum(
+                self.solid[x0:x1, y0:y1], surface, out=self.solid[x0:x1, y0:y1]
+            )
+
+    def best_position(
+        self, shapes, max_height, prefer_front, support_ratios
+    ) -> Optional[Tuple[float, float, float, object]]:
+        """Best (x, y, z, shape) over every aligned position and orientation.
+
+        support_ratios gives the minimum supported share for each shape.
+
+        Scoring matches find_best_position: stacking bonus, door penalty for
+        fragile passes, then lowest z, with ties going to the earlier
+        orientation and then to the largest x, y.
+        """
+        best = None
+        for k, shape in enumerate(shapes):
+            found = self._best_for_shape(
+                shape.length_mm,
+                shape.width_mm,
+                shape.height_mm,
+                max_height,
+                prefer_front,
+                support_ratios[k],
+            )
+            if found is not None:
+                score, x, y, z = found
+                key = (score, -k, x, y, z)
+                if best is None or key > best:
+                    best = key
+
+        if best is None:
+            return None
+        _, neg_k, x, y, z = best
+        return (x, y, z, shapes[-neg_k])
+
+    def _best_for_shape(
+        self, length, width, height, max_height, prefer_front, support_ratio
+    ) -> Optional[Tuple[float, float, float, float]]:
+        """Best (score, x, y, z) for one orientation, in one vectorized pass."""
+        r = self.res
+        nx, ny = self.top.shape
+
+        # Cells touched by the footprint (for height) and fully inside it (for support)
+        kx, ky = int(np.ceil(length / r)), int(np.ceil(width / r))
+        fx, fy = int(length // r), int(width // r)
+        if kx > nx or ky > ny:
+            return None
+
+        # Positions whose footprint stays inside the container
+        px = int((self.container.length_mm - length) // r) + 1
+        py = int((self.container.width_mm - width) // r) + 1
+        px, py = min(px, nx - kx + 1), min(py, ny - ky + 1)
+        if px <= 0 or py <= 0:
+            return None
+
+        z = window_max(self.top, kx, ky)[:px, :py]
+        fits = z + height <= max_height
+
+        score = np.where(z > 0, self.stacking_bonus, 0.0) - z * self.height_penalty
+        if prefer_front:
+            xs = np.arange(px) * r
+            door = np.where(xs > self.container.length_mm * 0.6, self.door_penalty, 0.0)
+            score -= door[:, None]
+
+        # Support: share of the footprint resting on cells exactly at z.
+        # Only cells wholly inside the footprint count, so if they cover less
+        # than the required share the item can only stand on the floor.
+        # Flat windows (inner minimum already at z) need no counting, and
+        # uneven ones are only counted if they could still beat a flat one.
+        area_cells = support_ratio * length * width / (r * r)
+        if fx * fy >= area_cells:
+            flat = window_min(self.solid, fx, fy)[:px, :py] >= z
+            valid = fits & ((z == 0) | flat)
+            uneven = fits & ~valid
+            if valid.any():
+                uneven &= score >= score[valid].max()
+            rows, cols = np.nonzero(uneven)
+            if rows.size:
+                at_level = count_at_level(self.solid, fx, fy, rows, cols, z[rows, cols])
+                valid[rows, cols] = at_level >= area_cells
+        else:
+            valid = fits & (z == 0)
+
+        if not valid.any():
+            return None
+        score = np.where(valid, score, -np.inf)
+
+        # Last flat index of the best score = largest x, then largest y
+        best = np.flatnonzero(score == score.max())[-1]
+        i, j = divmod(int(best), py)
+        return (float(score[i, j]), i * r, j * r, float(z[i, j]))
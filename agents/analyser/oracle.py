@@ -0,0 +1,498 @@
+"""
+Differential packing oracle
+Packs randomly generated problems with the reference shelf_pack path and
+with alternative engine settings, packs random loads with every fleet
+search, checks every layout with a strict validator and reports quality
+and speed side by side
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import packing
+from agent import run_fleet_search
+from benchmark import VEHICLES
+from packing import (
+    AXIS,
+    ORIENTATION_CODES,
+    PALLET_DECK_MM,
+    PALLET_NAME,
+    PackingContainer,
+    PackingItem,
+    PackingOptions,
+    PlacementTable,
+    container_volume,
+    pack_items_in_container,
+)
+from pallets import palletize, unpalletize
+from tiling import TilingLibrary
+
+EPS = 1e-6
+
+# Engine settings compared with the reference. The reference path is the
+# plain position search, one unit at a time.
+ENGINES = {
+    "reference": PackingOptions(blocks=False),
+    "blocks": PackingOptions(),
+    "extreme_points": PackingOptions(candidates="extreme_points"),
+    "heightmap": PackingOptions(engine="heightmap"),
+    "tiling": PackingOptions(tiling=True),
+    "pallets": PackingOptions(pallets=True),
+}
+
+# Fleet searches, each checked for valid vehicles and for every unit placed
+# or reported unplaced exactly once across the fleet
+FLEET_SEARCHES = {
+    "sequential": PackingOptions(),
+    "parallel": PackingOptions(fleet_search="parallel", restarts=1),
+    "assign": PackingOptions(fleet_search="assign"),
+    "assign_heightmap": PackingOptions(fleet_search="assign", engine="heightmap"),
+    "assign_tiling": PackingOptions(fleet_search="assign", tiling=True),
+    "assign_pallets": PackingOptions(fleet_search="assign", pallets=True),
+}
+
+
+class Problem(NamedTuple):
+    """One container, units already loaded in it, and the units to pack."""
+
+    seed: int
+    container: PackingContainer
+    preload: List[PackingItem]
+    items: List[PackingItem]
+
+
+class FleetProblem(NamedTuple):
+    """A load of units and the vehicles available for it."""
+
+    seed: int
+    fleet: List[PackingContainer]
+    items: List[PackingItem]
+
+
+class Run(NamedTuple):
+    """One engine's result on a problem."""
+
+    placed: int
+    volume: float
+    seconds: float
+    violations: List[str]
+
+
+def random_problem(seed: int, max_units: int = 200) -> Problem:
+    """A seeded random problem.
+
+    A fleet vehicle or an odd-sized container, up to eight products of
+    awkward sizes (some fragile or upright), and sometimes a floor already
+    partly loaded.
+    """
+    rnd = random.Random(seed)
+    if rnd.random() < 0.5:
+        container = PackingContainer(**rnd.choice(VEHICLES))
+    else:
+        container = PackingContainer(
+            f"random-{seed}",
+            rnd.randrange(800, 6200, 10),
+            rnd.randrange(600, 2500, 10),
+            rnd.randrange(500, 2800, 10),
+            rnd.choice([300, 1000, 5000, 20000]),
+        )
+
+    units = random_units(rnd, max_units)
+    preload = []
+    if rnd.random() < 0.25:
+        split = rnd.randint(1, len(units))
+        preload, units = units[:split], units[split:]
+    return Problem(seed, container, preload, units)
+
+
+def random_units(rnd: random.Random, max_units: int) -> List[PackingItem]:
+    """Up to max_units units of one to eight awkward products, shuffled."""
+    units = []
+    for sku in range(rnd.randint(1, 8)):
+        unit = PackingItem(
+            name=f"SKU-{sku}",
+            length_mm=rnd.choice([rnd.randrange(60, 900, 10), rnd.uniform(60, 900)]),
+            width_mm=rnd.randrange(60, 700, 10),
+            height_mm=rnd.randrange(50, 700, 5),
+            weight_kg=rnd.choice([0.5, 2, 5, 12.5, 25, 60]),
+            fragile=rnd.random() < 0.25,
+            upright=rnd.random() < 0.15,
+            order_id=rnd.choice([None, rnd.randint(1, 4)]),
+        )
+        units.extend([unit] * rnd.randint(1, max(1, max_units // 4)))
+    rnd.shuffle(units)
+    return units[:max_units]
+
+
+def random_load(seed: int, max_units: int = 400) -> FleetProblem:
+    """A seeded random load for some of the fleet vehicles."""
+    rnd = random.Random(seed)
+    fleet = [
+        PackingContainer(**vehicle)
+        for vehicle in rnd.sample(VEHICLES, rnd.randint(1, len(VEHICLES)))
+    ]
+    return FleetProblem(seed, fleet, random_units(rnd, max_units))
+
+
+@contextmanager
+def tiling_library_for(loads: Iterable[Tuple[List[PackingItem], List]]):
+    """Point the packer at a floor-tiling library of random loads.
+
+    loads are (units, containers) pairs; every unit shape gets a pattern on
+    every container of its own load. Random products are in no stored
+    library, so without one the tiling settings would pack exactly like the
+    reference.
+    """
+    library = TilingLibrary()
+    for units, containers in loads:
+        shapes = {
+            (u.length_mm, u.width_mm, u.height_mm, u.keeps_upright()) for u in units
+        }
+        for c in containers:
+            for shape in shapes:
+                library.add(*shape, (c.length_mm, c.width_mm, c.height_mm))
+
+    # tiling_library() keeps the library it loaded, so it is cleared on the
+    # way in and out: each call of this packs with its own library
+    previous = packing.TILING_LIBRARY_PATH
+    with tempfile.TemporaryDirectory() as folder:
+        packing.TILING_LIBRARY_PATH = os.path.join(folder, "tiling_library.json")
+        library.save(packing.TILING_LIBRARY_PATH)
+        packing.tiling_library.cache_clear()
+        try:
+            yield library
+        finally:
+            packing.TILING_LIBRARY_PATH = previous
+            packing.tiling_library.cache_clear()
+
+
+def layout_violations(container, table: PlacementTable, options) -> List[str]:
+    """Bounds, overlaps, support and payload of one vehicle's boxes.
+
+    Every pair of boxes is compared directly (no sweep or spatial index),
+    and every raised box must rest on the tops exactly below it.
+    """
+    boxes = [table.box(i) for i in range(len(table))]
+    errors = []
+
+    for i, (x, y, z, l, w, h) in enumerate(boxes):
+        if min(x, y, z) < -EPS:
+            errors.append(f"row {i}: negative position ({x}, {y}, {z})")
+        if (
+            x + l > container.length_mm + EPS
+            or y + w > container.width_mm + EPS
+            or z + h > container.height_mm + EPS
+        ):
+            errors.append(f"row {i}: outside the container")
+
+    for i, (x1, y1, z1, l1, w1, h1) in enumerate(boxes):
+        for j in range(i + 1, len(boxes)):
+            x2, y2, z2, l2, w2, h2 = boxes[j]
+            if (
+                min(x1 + l1, x2 + l2) - max(x1, x2) > EPS
+                and min(y1 + w1, y2 + w2) - max(y1, y2) > EPS
+                and min(z1 + h1, z2 + h2) - max(z1, z2) > EPS
+            ):
+                errors.append(f"rows {i} and {j} overlap")
+
+    for i, (x, y, z, l, w, _) in enumerate(boxes):
+        if z <= EPS:
+            continue
+        area = 0.0
+        for px, py, pz, pl, pw, ph in boxes:
+            if abs(pz + ph - z) <= EPS:
+                area += max(0.0, min(x + l, px + pl) - max(x, px)) * max(
+                    0.0, min(y + w, py + pw) - max(y, py)
+                )
+        if area < options.support_ratio * l * w - EPS:
+            errors.append(f"row {i}: {area / (l * w):.0%} of its base supported")
+
+    if table.total_weight() > container.max_weight_kg + EPS:
+        errors.append(f"load {table.total_weight():.1f} kg over the payload")
+
+    return errors
+
+
+def unit_violations(
+    items: List[PackingItem], placed: List[PlacementTable], leftover
+) -> List[str]:
+    """Orientation and order id of every placed unit, and that every unit
+    was placed or left over exactly once across the tables.
+
+    Pallet decks are checked for their height only; they are not units.
+    """
+    units = {}
+    for unit in items:
+        units[unit.name] = unit
+    packed = Counter()
+    errors = []
+    for table in placed:
+        for i in range(len(table)):
+            if table.names[i] == PALLET_NAME:
+                if abs(table.box(i)[5] - PALLET_DECK_MM) > EPS:
+                    errors.append(f"row {i}: pallet deck {table.box(i)[5]} mm high")
+                continue
+            unit = units.get(table.names[i])
+            code = table.code(i)
+            if unit is None:
+                errors.append(f"row {i}: unknown item {table.names[i]}")
+                continue
+            dims = (unit.length_mm, unit.width_mm, unit.height_mm)
+            if tuple(dims[AXIS[a]] for a in code) != table.box(i)[3:]:
+                errors.append(f"row {i}: dimensions do not match orientation {code}")
+            if unit.keeps_upright() and code not in ORIENTATION_CODES[:2]:
+                errors.append(f"row {i}: upright item {unit.name} laid on its side")
+            if table.order_id(i) != unit.order_id:
+                errors.append(f"row {i}: order id {table.order_id(i)} for {unit.name}")
+            packed[unit.name] += 1
+    packed.update(unit.name for unit in leftover)
+    if packed != Counter(unit.name for unit in items):
+        errors.append("units placed or left over more or less than once")
+    return errors
+
+
+def strict_violations(
+    problem: Problem,
+    existing: PlacementTable,
+    placed: PlacementTable,
+    leftover: List[PackingItem],
+    options: PackingOptions,
+) -> List[str]:
+    """Check a layout from first principles, independent of the engine.
+
+    The container with the preloaded and the new boxes passes
+    layout_violations, and every new unit passes unit_violations.
+    """
+    table = existing.copy()
+    table.extend(placed)
+    return layout_violations(problem.container, table, options) + unit_violations(
+        problem.items, [placed], leftover
+    )
+
+
+def fleet_violations(problem: FleetProblem, packed, leftover, options) -> List[str]:
+    """Check a fleet layout: each vehicle used once and valid, and every
+    unit placed in one vehicle or reported unplaced, exactly once."""
+    errors = []
+    seen = set()
+    for container, placements in packed:
+        if container not in problem.fleet or id(container) in seen:
+            errors.append(f"{container.id}: not in the fleet, or loaded twice")
+        seen.add(id(container))
+        errors.extend(
+            f"{container.id} {message}"
+            for message in layout_violations(container, placements, options)
+        )
+    return errors + unit_violations(
+        problem.items, [placements for _, placements in packed], leftover
+    )
+
+
+def run_engine(problem: Problem, options: PackingOptions, existing) -> Run:
+    """Pack a problem with one engine setting and check the layout."""
+    start = time.perf_counter()
+    items = problem.items
+    if options.pallets:
+        items = palletize(items, [problem.container], options)
+    placed, leftover = pack_items_in_container(
+        problem.container, items, options, existing_placements=existing
+    )
+    leftover = unpalletize(leftover)
+    seconds = time.perf_counter() - start
+    return Run(
+        placed=len(placed),
+        volume=placed.volume(),
+        seconds=seconds,
+        violations=strict_violations(problem, existing, placed, leftover, options),
+    )
+
+
+def run_fleet(problem: FleetProblem, options: PackingOptions) -> Run:
+    """Pack a load with one fleet search, as pack_load does, and check it."""
+    start = time.perf_counter()
+    items = problem.items
+    if options.pallets:
+        items = palletize(items, problem.fleet, options)
+    packed, leftover = run_fleet_search(items, problem.fleet, options)
+    leftover = unpalletize(leftover)
+    seconds = time.perf_counter() - start
+    return Run(
+        placed=len(problem.items) - len(leftover),
+        volume=sum(placements.volume() for _, placements in packed),
+        seconds=seconds,
+        violations=fleet_violations(problem, packed, leftover, options),
+    )
+
+
+def compare_engines(
+    problems: int, seed: int, engines: List[str], max_units: int
+) -> Dict[str, Dict]:
+    """Run the reference and every engine over the same random problems.
+
+    Returns per engine: problems with violations (and the first messages,
+    with the seed that reproduces them), units and fill against the
+    reference, and total pack time of both.
+    """
+    report = {
+        name: {
+            "invalid": [],
+            "placed_delta": 0,
+            "worse": 0,
+            "better": 0,
+            "fill_delta": 0.0,
+            "seconds": 0.0,
+            "reference_seconds": 0.0,
+        }
+        for name in ["reference", *engines]
+    }
+    cases = [random_problem(seed + k, max_units) for k in range(problems)]
+    with tiling_library_for((p.items, [p.container]) for p in cases):
+        for k, problem in enumerate(cases):
+            compare_on(problem, k, engines, report)
+    return report
+
+
+def compare_on(problem: Problem, k: int, engines: List[str], report: Dict):
+    """Pack one problem with the reference and every engine, into report."""
+    volume = container_volume(problem.container)
+    existing = PlacementTable()
+    if problem.preload:
+        # Both sides pack around the same boxes already in the container
+        existing, _ = pack_items_in_container(
+            problem.container, problem.preload, ENGINES["reference"]
+        )
+
+    runs = {}
+    # Alternate which side runs first, so warm caches favour neither
+    order = ["reference", *engines] if k % 2 else [*engines, "reference"]
+    for name in order:
+        runs[name] = run_engine(problem, ENGINES[name], existing)
+
+    reference = runs["reference"]
+    for name, run in runs.items():
+        entry = report[name]
+        if run.violations:
+            entry["invalid"].append((problem.seed, run.violations[:3]))
+        entry["placed_delta"] += run.placed - reference.placed
+        entry["worse"] += run.placed < reference.placed
+        entry["better"] += run.placed > reference.placed
+        entry["fill_delta"] += (run.volume - reference.volume) / volume
+        entry["seconds"] += run.seconds
+        entry["reference_seconds"] += reference.seconds
+
+
+def check_fleet_searches(
+    problems: int, seed: int, searches: List[str], max_units: int
+) -> Dict[str, Dict]:
+    """Pack random loads with every fleet search and check the layouts.
+
+    Returns per search: loads with violations (with the seed that
+    reproduces them), units placed and total pack time.
+    """
+    report = {
+        name: {"invalid": [], "placed": 0, "units": 0, "seconds": 0.0}
+        for name in searches
+    }
+    cases = [random_load(seed + k, max_units) for k in range(problems)]
+    with tiling_library_for((p.items, p.fleet) for p in cases):
+        for problem in cases:
+            for name in searches:
+                run = run_fleet(problem, FLEET_SEARCHES[name])
+                entry = report[name]
+                if run.violations:
+                    entry["invalid"].append((problem.seed, run.violations[:3]))
+                entry["placed"] += run.placed
+                entry["units"] += len(problem.items)
+                entry["seconds"] += run.seconds
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--problems", type=int, default=200, help="Random problems to pack"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the first problem"
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=[name for name in ENGINES if name != "reference"],
+        default=[name for name in ENGINES if name != "reference"],
+        help="Engine settings to compare with the reference",
+    )
+    parser.add_argument(
+        "--max-units", type=int, default=200, help="Most units in one problem"
+    )
+    parser.add_argument(
+        "--fleet-problems", type=int, default=20, help="Random loads to pack"
+    )
+    parser.add_argument(
+        "--searches",
+        nargs="+",
+        choices=list(FLEET_SEARCHES),
+        default=list(FLEET_SEARCHES),
+        help="Fleet searches to check",
+    )
+    parser.add_argument(
+        "--fleet-units", type=int, default=400, help="Most units in one load"
+    )
+    args = parser.parse_args()
+
+    report = compare_engines(args.problems, args.seed, args.engines, args.max_units)
+    fleet_report = check_fleet_searches(
+        args.fleet_problems, args.seed, args.searches, args.fleet_units
+    )
+
+    print(
+        f"{'engine':>16} {'invalid':>8} {'units':>7} {'worse':>6} {'better':>7}"
+        f" {'fill':>7} {'time_s':>8} {'ref_s':>8} {'speedup':>8}"
+    )
+    for name, entry in report.items():
+        speedup = (
+            entry["reference_seconds"] / entry["seconds"] if entry["seconds"] else 0.0
+        )
+        print(
+            f"{name:>16} {len(entry['invalid']):>8} {entry['placed_delta']:>+7}"
+            f" {entry['worse']:>6} {entry['better']:>7}"
+            f" {entry['fill_delta'] / max(args.problems, 1):>+7.2%}"
+            f" {entry['seconds']:>8.3f} {entry['reference_seconds']:>8.3f}"
+            f" {speedup:>7.2f}x"
+        )
+
+    print(f"\n{'search':>16} {'invalid':>8} {'placed':>9} {'time_s':>8}")
+    for name, entry in fleet_report.items():
+        print(
+            f"{name:>16} {len(entry['invalid']):>8}"
+            f" {entry['placed'] / max(entry['units'], 1):>9.2%}"
+            f" {entry['seconds']:>8.3f}"
+        )
+
+    failed = False
+    for name, entry in report.items():
+        for problem_seed, messages in entry["invalid"]:
+            failed = True
+            print(
+                f"INVALID {name} --seed {problem_seed} --problems 1"
+                f" --fleet-problems 0: {messages}"
+            )
+    for name, entry in fleet_report.items():
+        for problem_seed, messages in entry["invalid"]:
+            failed = True
+            print(
+                f"INVALID {name} --seed {problem_seed} --problems 0"
+                f" --fleet-problems 1: {messages}"
+            )
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
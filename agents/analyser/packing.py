@@ -0,0 +1,1650 @@
+"""
+Packing engine
+Places the units of a load in one container: item types, orientations, the
+placement table and spatial index, candidate positions, the shelf passes and
+validation
+"""
+
+import heapq
+import os
+import random
+import time
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain, islice, repeat
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from profiles import ACTIVE_PROFILE
+
+# Floor-tiling library written by tiling.py (default: tiling_library.json here)
+TILING_LIBRARY_PATH = os.getenv("TILING_LIBRARY_PATH")
+
+
+@dataclass
+class PackingItem:
+    name: str
+    length_mm: float
+    width_mm: float
+    height_mm: float
+    weight_kg: float
+    fragile: bool = False
+    upright: bool = False
+    order_id: Optional[int] = None
+
+    def volume(self) -> float:
+        return self.length_mm * self.width_mm * self.height_mm
+
+    def keeps_upright(self) -> bool:
+        """Fragile items may only turn about the vertical axis."""
+        return self.upright or self.fragile
+
+    def unit_count(self) -> int:
+        return 1
+
+    def unit_weight_kg(self) -> float:
+        return self.weight_kg
+
+
+class ItemRun(NamedTuple):
+    """`quantity` identical units of one product line, kept as one entry.
+
+    The units share one PackingItem, so a run of any length stays a single
+    object until the position search needs its units one by one.
+    """
+
+    item: PackingItem
+    quantity: int
+
+    def volume(self) -> float:
+        return self.item.volume() * self.quantity
+
+    def weight_kg(self) -> float:
+        return self.item.weight_kg * self.quantity
+
+    def units(self) -> List[PackingItem]:
+        return [self.item] * self.quantity
+
+
+def item_runs(items) -> List[ItemRun]:
+    """Consecutive entries of one shared unit as runs, e.g. for leftovers."""
+    runs: List[ItemRun] = []
+    for item in items:
+        if runs and runs[-1].item is item:
+            runs[-1] = ItemRun(item, runs[-1].quantity + 1)
+        else:
+            runs.append(ItemRun(item, 1))
+    return runs
+
+
+def expand_runs(runs) -> List[PackingItem]:
+    """One entry per unit, the form the position search packs."""
+    return [unit for run in runs for unit in run.units()]
+
+
+# Axis positions of the l, w, h letters used in orientation codes
+AXIS = {"l": 0, "w": 1, "h": 2}
+
+
+@dataclass
+class ItemBlock(PackingItem):
+    """Identical units packed as one cuboid of counts = (along L, along W, layers).
+
+    The packer treats a block as a single item; expand() turns its placement
+    back into one placement per unit.
+    """
+
+    units: List[PackingItem] = field(default_factory=list)
+    counts: Tuple[int, int, int] = (1, 1, 1)
+
+    @classmethod
+    def of(cls, units: List[PackingItem], counts: Tuple[int, int, int]):
+        unit = units[0]
+        return cls(
+            name=f"{unit.name} x{len(units)}",
+            length_mm=unit.length_mm * counts[0],
+            width_mm=unit.width_mm * counts[1],
+            height_mm=unit.height_mm * counts[2],
+            weight_kg=sum(u.weight_kg for u in units),
+            fragile=unit.fragile,
+            upright=unit.upright,
+            order_id=(
+                unit.order_id
+                if all(u.order_id == unit.order_id for u in units)
+                else None
+            ),
+            units=units,
+            counts=counts,
+        )
+
+    def unit_count(self) -> int:
+        return len(self.units)
+
+    def unit_weight_kg(self) -> float:
+        return self.units[0].weight_kg
+
+    def split(self) -> List[PackingItem]:
+        """Halve the block along its longest run: length, then width, then layers."""
+        for axis in range(3):
+            if self.counts[axis] > 1:
+                break
+        first = list(self.counts)
+        first[axis] = self.counts[axis] // 2
+        second = list(self.counts)
+        second[axis] = self.counts[axis] - first[axis]
+
+        size = first[0] * first[1] * first[2]
+        pieces = [(self.units[:size], first), (self.units[size:], second)]
+        return [
+            units[0] if len(units) == 1 else ItemBlock.of(units, tuple(counts))
+            for units, counts in pieces
+        ]
+
+    def expand(self, table: "PlacementTable", x, y, z, code: str, order: int):
+        """Append one placement per unit to the table, bottom layer first."""
+        unit = self.units[0]
+        base = (unit.length_mm, unit.width_mm, unit.height_mm)
+        ul, uw, uh = (base[AXIS[a]] for a in code)
+        nx, ny, nz = (self.counts[AXIS[a]] for a in code)
+
+        members = iter(self.units)
+        for iz in range(nz):
+            for ix in range(nx):
+                for iy in range(ny):
+                    member = next(members)
+                    table.append(
+                        member.name,
+                        x + ix * ul,
+                        y + iy * uw,
+                        z + iz * uh,
+                        ul,
+                        uw,
+                        uh,
+                        code,
+                        order,
+                        member.fragile,
+                        weight_kg=member.weight_kg,
+                        order_id=member.order_id,
+                    )
+
+
+# Deck height and own weight of a pallet (ISO 1200 × 1000 wooden pallet)
+PALLET_DECK_MM = 144
+PALLET_TARE_KG = 25.0
+# Item name of the placements that stand for pallet decks
+PALLET_NAME = "PALLET"
+
+
+@dataclass
+class Pallet(PackingItem):
+    """A loaded pallet, packed into a vehicle as one upright item.
+
+    placements are its cartons, relative to the top of the deck; expand()
+    turns the pallet's placement back into one for the deck and one per
+    carton. units are the cartons as they were loaded, by name and order
+    id. A pallet placed in a vehicle goes into its table as the deck and the
+    cartons right away, so loose cartons only rest on the load's real top.
+    """
+
+    placements: Optional["PlacementTable"] = None
+    units: Dict[Tuple[str, Optional[int]], PackingItem] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, name: str, length, width, placements: "PlacementTable", units):
+        load_height = max(
+            (placements.z[i] + placements.h[i] for i in range(len(placements))),
+            default=0.0,
+        )
+        order_ids = set(placements.order_ids)
+        return cls(
+            name=name,
+            length_mm=length,
+            width_mm=width,
+            height_mm=PALLET_DECK_MM + load_height,
+            weight_kg=PALLET_TARE_KG + placements.total_weight(),
+            fragile=any(placements.fragile),
+            upright=True,
+            order_id=placements.order_id(0) if len(order_ids) == 1 else None,
+            placements=placements,
+            units=units,
+        )
+
+    def cartons(self) -> List[PackingItem]:
+        """The cartons on the pallet as they were loaded, in any orientation
+        again, e.g. to pack them loose or report them unplaced."""
+        table = self.placements
+        return [
+            self.units[table.names[i], table.order_id(i)] for i in range(len(table))
+        ]
+
+    def expand(self, table: "PlacementTable", x, y, z, code: str, order: int):
+        """Append the deck and one placement per carton to the table."""
+        # Turned about the vertical axis, the pallet's L and W swap over
+        turned = code == "wlh"
+        length, width = (
+            (self.width_mm, self.length_mm)
+            if turned
+            else (self.length_mm, self.width_mm)
+        )
+        table.append(
+            PALLET_NAME,
+            x,
+            y,
+            z,
+            length,
+            width,
+            PALLET_DECK_MM,
+            code,
+            order,
+            weight_kg=PALLET_TARE_KG,
+        )
+
+        load = self.placements
+        for i in range(len(load)):
+            cx, cy, cz, cl, cw, ch = load.box(i)
+            carton_code = load.code(i)
+            if turned:
+                cx, cy, cl, cw = cy, cx, cw, cl
+                carton_code = carton_code[1] + carton_code[0] + carton_code[2]
+            table.append(
+                load.names[i],
+                x + cx,
+                y + cy,
+                z + PALLET_DECK_MM + cz,
+                cl,
+                cw,
+                ch,
+                carton_code,
+                order,
+                bool(load.fragile[i]),
+                weight_kg=load.weight[i],
+                order_id=load.order_id(i),
+            )
+
+
+def required_support(item, shape: "Orientation", ratio: float) -> float:
+    """Support ratio an item needs in a given orientation.
+
+    A block may leave at most the overhang one unit is allowed, so that every
+    unit of its bottom layer still meets `ratio` once the block is expanded.
+    """
+    if not isinstance(item, ItemBlock):
+        return ratio
+    layers = item.counts[AXIS[shape.code[2]]]
+    return 1 - (1 - ratio) * layers / item.unit_count()
+
+
+def build_blocks(items: List[PackingItem], container) -> List[PackingItem]:
+    """Group identical units into dense blocks that fit the container.
+
+    Each block is as tall as the container allows, then as wide, then as long;
+    what is left of a group forms smaller blocks down to single units. Groups
+    are built from runs of units, and a block only lists its own units.
+    """
+    groups: Dict[Tuple, List[ItemRun]] = {}
+    blocks: List[PackingItem] = []
+    for run in item_runs(items):
+        if isinstance(run.item, Pallet):
+            blocks.append(run.item)  # already one item of many cartons
+            continue
+        groups.setdefault(item_key(run.item), []).append(run)
+
+    for runs in groups.values():
+        unit = runs[0].item
+        members = chain.from_iterable(repeat(r.item, r.quantity) for r in runs)
+        max_x = int(container.length_mm // unit.length_mm)
+        max_y = int(container.width_mm // unit.width_mm)
+        max_z = int(container.height_mm // unit.height_mm)
+        if not (max_x and max_y and max_z):
+            blocks.extend(members)  # only fits rotated, leave to the search
+            continue
+
+        remaining = sum(r.quantity for r in runs)
+        while remaining:
+            nz = min(max_z, remaining)
+            ny = min(max_y, remaining // nz)
+            nx = min(max_x, remaining // (nz * ny))
+            size = nx * ny * nz
+            chunk = list(islice(members, size))
+            blocks.append(chunk[0] if size == 1 else ItemBlock.of(chunk, (nx, ny, nz)))
+            remaining -= size
+    return blocks
+
+
+def expand_blocks(placements: "PlacementTable", start_order: int = 1):
+    """Expand block and pallet placements into unit placements and renumber."""
+    if not placements.blocks:
+        expanded = placements.copy()
+    else:
+        expanded = PlacementTable()
+        for i in range(len(placements)):
+            block = placements.blocks.get(i)
+            if block:
+                x, y, z = placements.x[i], placements.y[i], placements.z[i]
+                block.expand(expanded, x, y, z, placements.code(i), placements.order[i])
+            else:
+                expanded.append(
+                    placements.names[i],
+                    *placements.box(i),
+                    placements.code(i),
+                    placements.order[i],
+                    placements.fragile[i],
+                    weight_kg=placements.weight[i],
+                    order_id=placements.order_id(i),
+                )
+    expanded.order = array("l", range(start_order, start_order + len(expanded)))
+    return expanded
+
+
+@dataclass
+class PackingContainer:
+    id: str
+    length_mm: float
+    width_mm: float
+    height_mm: float
+    max_weight_kg: float
+
+
+# Share of an item's footprint that must rest on the box below it
+MIN_SUPPORT_RATIO = 0.80
+ORDER_JITTER = 0.25  # relative weight jitter of a perturbed packing order
+# Bump whenever an engine change alters the layout produced for the same input
+ENGINE_VERSION = 8
+
+
+@dataclass
+class PackingOptions:
+    """Tunable behaviour of the packing engine.
+
+    engine: "reference" searches candidate positions one by one against the
+        placement index, "heightmap" scores all positions of an item at once
+        on a NumPy height map (see heightmap.py).
+    candidates: "grid" scans the floor in fixed steps, "extreme_points" only
+        tries the corners created by boxes already placed (reference engine).
+    heightmap_resolution_mm: cell size of the height map.
+    support_ratio: minimum supported share of a stacked item's footprint.
+    rotation: try every allowed orientation of an item, not only L × W × H.
+    blocks: pack identical units as dense blocks instead of one by one.
+    fleet_search: "sequential" fills vehicles smallest first; "parallel" also
+        packs the whole load led by every available vehicle in a process pool
+        and keeps the best result by `objective`; "assign" first distributes
+        whole orders over the vehicles (see assign_orders) and then packs
+        every vehicle in parallel.
+    assign_fill: share of a vehicle's volume the "assign" search plans to
+        fill. Units that still do not fit their vehicle are packed into the
+        others afterwards.
+    objective: ranking of fleet results, most important first, from
+        "vehicles" (fewest), "volume" (smallest total) and "utilisation"
+        (highest fill). Results that leave items unplaced always rank last.
+    deadline: wall-clock time (time.time()) after which shelf_pack stops
+        placing and leaves the rest of its items over. Set from the time
+        budget of choose_containers_and_pack, not by callers.
+    stacking_bonus, door_penalty, height_penalty: position score weights
+        (bonus for resting on a box, penalty for fragile items far from the
+        door, penalty per mm of height).
+    order_seed: if set, item weights are jittered by up to ORDER_JITTER with
+        this seed before sorting, so the packing order varies reproducibly.
+    restarts: number of extra runs with seeded perturbations of the item
+        order and score weights, packed in the process pool next to the
+        parallel fleet search (implies it, unless the search is "assign").
+        The same seed gives the same runs.
+    seed: seed the restarts are derived from.
+    profile: collect engine counters and phase timers (see PackingProfile)
+        into the summary's "profile" and a structured log line. Also on for
+        every run with PACKING_PROFILE=1.
+    pallets: pack the cartons onto pallets first and then the pallets into
+        the vehicles (see palletize).
+    pallet_mm: pallet footprint and the load height allowed above its deck.
+    pallet_max_weight_kg: load a pallet may carry.
+    tiling: lay whole floor layers of the heaviest product in the stored
+        pattern of the floor-tiling library (see seed_layers) before the
+        position search.
+    """
+
+    engine: str = "reference"
+    candidates: str = "grid"
+    heightmap_resolution_mm: float = 50.0
+    support_ratio: float = MIN_SUPPORT_RATIO
+    rotation: bool = True
+    blocks: bool = True
+    fleet_search: str = "sequential"
+    assign_fill: float = 0.8
+    objective: Tuple[str, ...] = ("vehicles", "volume", "utilisation")
+    deadline: Optional[float] = None
+    stacking_bonus: float = 100.0
+    door_penalty: float = 50.0
+    height_penalty: float = 0.001
+    order_seed: Optional[int] = None
+    restarts: int = 0
+    seed: int = 0
+    profile: bool = False
+    pallets: bool = False
+    pallet_mm: Tuple[float, float, float] = (1200.0, 1000.0, 1500.0)
+    pallet_max_weight_kg: float = 1000.0
+    tiling: bool = False
+
+
+# Orientation codes: the item axes (l, w, h) lying along the container's L, W, H.
+# The first two keep the item upright.
+ORIENTATION_CODES = ("lwh", "wlh", "lhw", "hlw", "whl", "hwl")
+CODE_IDS = {code: k for k, code in enumerate(ORIENTATION_CODES)}
+
+
+class Orientation(NamedTuple):
+    """One way of setting an item down; code names the axes now along L, W, H."""
+
+    code: str
+    length_mm: float
+    width_mm: float
+    height_mm: float
+
+
+@lru_cache(maxsize=None)
+def orientation_table(length, width, height, upright) -> Tuple[Orientation, ...]:
+    """Distinct orientations of a box shape, computed once per shape.
+
+    Upright boxes only swap length and width; others may lie on any side.
+    """
+    dims = {"l": length, "w": width, "h": height}
+    codes = ORIENTATION_CODES[:2] if upright else ORIENTATION_CODES
+
+    table, seen = [], set()
+    for code in codes:
+        shape = tuple(dims[axis] for axis in code)
+        if shape not in seen:
+            seen.add(shape)
+            table.append(Orientation(code, *shape))
+    return tuple(table)
+
+
+@lru_cache(maxsize=None)
+def fitting_orientations(
+    length, width, height, upright, rotation, container_dims
+) -> Tuple[Orientation, ...]:
+    """Orientations of a shape that fit inside the container at all."""
+    shapes = orientation_table(length, width, height, upright)
+    if not rotation:
+        shapes = shapes[:1]
+    cl, cw, ch = container_dims
+    return tuple(
+        o
+        for o in shapes
+        if o.length_mm <= cl and o.width_mm <= cw and o.height_mm <= ch
+    )
+
+
+def item_orientations(item, container, options) -> Tuple[Orientation, ...]:
+    """Cached orientation table of an item for a given container."""
+    return fitting_orientations(
+        item.length_mm,
+        item.width_mm,
+        item.height_mm,
+        item.keeps_upright(),
+        options.rotation,
+        (container.length_mm, container.width_mm, container.height_mm),
+    )
+
+
+# Order id column value of placements that belong to no order
+NO_ORDER = -1
+
+
+def whole_mm(value: float):
+    """Whole millimetres as int, so written layouts keep their integer form."""
+    return int(value) if value.is_integer() else value
+
+
+class PlacementTable:
+    """Placements of one container as parallel columns (struct of arrays).
+
+    Box geometry and weight are kept in array('d') columns x, y, z, l, w, h
+    and weight, with the placement order, order id (NO_ORDER if none),
+    fragile flag and orientation code id in integer arrays and the item
+    names (product names, shared by the units of a product) in a list. Rows
+    are turned into placement dicts only at the output boundary (to_dicts),
+    e.g. by transform_to_ui_format. Blocks and pallets not yet expanded are
+    kept by row.
+    """
+
+    ARRAYS = (
+        "x",
+        "y",
+        "z",
+        "l",
+        "w",
+        "h",
+        "weight",
+        "order",
+        "order_ids",
+        "fragile",
+        "codes",
+    )
+
+    def __init__(self):
+        self.x = array("d")
+        self.y = array("d")
+        self.z = array("d")
+        self.l = array("d")
+        self.w = array("d")
+        self.h = array("d")
+        self.weight = array("d")
+        self.order = array("l")
+        self.order_ids = array("q")
+        self.fragile = array("b")
+        self.codes = array("b")
+        self.names: List[str] = []
+        self.blocks: Dict[int, "ItemBlock"] = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(
+        self,
+        name: str,
+        x,
+        y,
+        z,
+        length,
+        width,
+        height,
+        code: str = "lwh",
+        order: int = 0,
+        fragile: bool = False,
+        block: Optional["ItemBlock"] = None,
+        weight_kg: float = 0.0,
+        order_id: Optional[int] = None,
+    ) -> int:
+        """Add one placement and return its row."""
+        row = len(self.names)
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self.l.append(length)
+        self.w.append(width)
+        self.h.append(height)
+        self.weight.append(weight_kg)
+        self.order.append(order)
+        self.order_ids.append(NO_ORDER if order_id is None else order_id)
+        self.fragile.append(fragile)
+        self.codes.append(CODE_IDS[code])
+        self.names.append(name)
+        if block is not None:
+            self.blocks[row] = block
+        return row
+
+    def box(self, i: int) -> Tuple[float, float, float, float, float, float]:
+        """(x, y, z, length, width, height) of row i."""
+        return (self.x[i], self.y[i], self.z[i], self.l[i], self.w[i], self.h[i])
+
+    def position(self, i: int) -> Tuple:
+        return (whole_mm(self.x[i]), whole_mm(self.y[i]), whole_mm(self.z[i]))
+
+    def code(self, i: int) -> str:
+        return ORIENTATION_CODES[self.codes[i]]
+
+    def order_id(self, i: int) -> Optional[int]:
+        order_id = self.order_ids[i]
+        return None if order_id == NO_ORDER else order_id
+
+    def volume(self) -> float:
+        """Total volume of the placed boxes."""
+        return sum(l * w * h for l, w, h in zip(self.l, self.w, self.h))
+
+    def total_weight(self) -> float:
+        """Total weight of the placed items in kg."""
+        return sum(self.weight)
+
+    def extend(self, other: "PlacementTable"):
+        """Append every row of another table (column-wise copies)."""
+        offset = len(self.names)
+        for column in self.ARRAYS:
+            getattr(self, column).extend(getattr(other, column))
+        self.names.extend(other.names)
+        self.blocks.update((offset + i, b) for i, b in other.blocks.items())
+
+    def tail(self, start: int) -> "PlacementTable":
+        """New table with the rows from `start` on."""
+        part = PlacementTable()
+        for column in self.ARRAYS:
+            setattr(part, column, getattr(self, column)[start:])
+        part.names = self.names[start:]
+        part.blocks = {i - start: b for i, b in self.blocks.items() if i >= start}
+        return part
+
+    def copy(self) -> "PlacementTable":
+        return self.tail(0)
+
+    def to_dicts(self) -> List[Dict]:
+        """Placement dicts, one per row, in row order."""
+        return [
+            {
+                "item_name": self.names[i],
+                "dimensions_mm": [
+                    whole_mm(self.l[i]),
+                    whole_mm(self.w[i]),
+                    whole_mm(self.h[i]),
+                ],
+                "position_mm": list(self.position(i)),
+                "orientation": self.code(i),
+                "placement_order": self.order[i],
+                "fragile": bool(self.fragile[i]),
+                "weight_kg": self.weight[i],
+                "order_id": self.order_id(i),
+            }
+            for i in range(len(self.names))
+        ]
+
+    @classmethod
+    def from_dicts(cls, placements: List[Dict]) -> "PlacementTable":
+        table = cls()
+        for n, p in enumerate(placements, start=1):
+            table.append(
+                p["item_name"],
+                *p["position_mm"],
+                *p["dimensions_mm"],
+                p.get("orientation", "lwh"),
+                p.get("placement_order", n),
+                p.get("fragile", False),
+                weight_kg=p.get("weight_kg", 0.0),
+                order_id=p.get("order_id"),
+            )
+        return table
+
+    @classmethod
+    def of(cls, placements) -> "PlacementTable":
+        """The table itself, or a table built from a list of placement dicts."""
+        if isinstance(placements, cls):
+            return placements
+        return cls.from_dicts(placements or [])
+
+
+# Edge length of the floor cells used by PlacementIndex
+INDEX_CELL_MM = 500
+
+
+class PlacementIndex:
+    """Uniform grid over the container floor for neighbour lookups.
+
+    Each cell lists the rows whose footprint touches it, so support and
+    collision queries only visit boxes around the candidate footprint instead
+    of every placement in the container. With extreme_points=True the index
+    also keeps the extreme-point set used as candidate positions, and with
+    candidate_cache=True a CandidateCache that every add() invalidates.
+
+    The index reads its boxes from a PlacementTable, shared with the caller:
+    append a row to `table`, then add() it. While the index lives it also
+    keeps each row's box as a tuple, so lookups hand out boxes without
+    reading the columns again.
+    """
+
+    def __init__(
+        self,
+        placements=None,
+        cell_mm: float = INDEX_CELL_MM,
+        extreme_points: bool = False,
+        candidate_cache: bool = False,
+    ):
+        self.cell_mm = cell_mm
+        self.table = PlacementTable.of(placements)
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        # Lowest top surface of the boxes touching each cell
+        self._lowest_top: Dict[Tuple[int, int], float] = {}
+        self._boxes: List[Tuple] = []
+        self.extreme_points = {(0.0, 0.0)} if extreme_points else None
+        self.candidate_cache = CandidateCache(cell_mm) if candidate_cache else None
+        for row in range(len(self.table)):
+            self.add(row)
+
+    def __len__(self):
+        return len(self.table)
+
+    def _cell_span(self, x, y, length, width):
+        c = self.cell_mm
+        return (
+            range(int(x // c), int((x + length) // c) + 1),
+            range(int(y // c), int((y + width) // c) + 1),
+        )
+
+    def add(self, row: int):
+        """Register a table row in every cell its footprint touches."""
+        box = self.table.box(row)
+        self._boxes.append(box)
+        px, py, pz, pl, pw, ph = box
+        top = pz + ph
+        cols, rows = self._cell_span(px, py, pl, pw)
+        for cx in cols:
+            for cy in rows:
+                self._cells.setdefault((cx, cy), []).append(row)
+                if top < self._lowest_top.get((cx, cy), top + 1):
+                    self._lowest_top[cx, cy] = top
+
+        if self.candidate_cache is not None:
+            self.candidate_cache.invalidate(box)
+
+        if self.extreme_points is None:
+            return
+
+        # Corners now buried under this box can only be reached from its top
+        self.extreme_points = {
+            pt for pt in self.extreme_points if not covers(box, *pt)
+        }
+        for pt in box_extreme_points(box):
+            if not any(covers(b, *pt) for b in self.near_boxes(pt[0], pt[1], 0, 0)):
+                self.extreme_points.add(pt)
+
+    def near(self, x, y, length, width) -> List[int]:
+        """Rows whose footprint may overlap the given footprint, in row order."""
+        cols, rows = self._cell_span(x, y, length, width)
+        found = set()
+        for cx in cols:
+            for cy in rows:
+                found.update(self._cells.get((cx, cy), ()))
+        return sorted(found)
+
+    def lowest_top(self, x, y, length, width) -> Optional[float]:
+        """Lowest top surface of the boxes near a footprint, None if none is.
+
+        An item over this footprint either stands on the floor or rests at
+        least this high.
+        """
+        cols, rows = self._cell_span(x, y, length, width)
+        tops = self._lowest_top
+        found = [tops[cx, cy] for cx in cols for cy in rows if (cx, cy) in tops]
+        return min(found) if found else None
+
+    def near_boxes(self, x, y, length, width) -> List[Tuple]:
+        """Boxes (x, y, z, l, w, h) of the rows near a footprint, in row order."""
+        boxes = self._boxes
+        return [boxes[i] for i in self.near(x, y, length, width)]
+
+
+# Item shapes whose evaluated positions a CandidateCache keeps
+CANDIDATE_CACHE_SHAPES = 32
+# Marks a candidate position that has not been tested yet
+UNTESTED = object()
+
+
+class CandidateCache:
+    """Evaluated candidate positions of a PlacementIndex, kept between searches.
+
+    Whether a shape fits at (x, y), and at which height, only depends on the
+    boxes whose footprint overlaps the shape's footprint there. Results are
+    therefore kept per shape (dimensions, required support and height limit)
+    and position until a box is placed over that footprint, so the next item
+    of the same size, and later passes over the same container, only evaluate
+    the positions that changed. Scores are not cached: they depend on the
+    pass (door preference) and are cheap to recompute.
+
+    Each entry is the height the shape rests at, or None if it cannot be
+    placed there. Only the most recently used shapes are kept.
+    """
+
+    def __init__(self, cell_mm: float = INDEX_CELL_MM):
+        self.cell_mm = cell_mm
+        # shape key -> ((x, y) -> z or None, floor cell -> positions in it)
+        self._shapes: "OrderedDict[Tuple, Tuple[Dict, Dict]]" = OrderedDict()
+
+    def _entry(self, key: Tuple) -> Tuple[Dict, Dict]:
+        entry = self._shapes.get(key)
+        if entry is None:
+            entry = self._shapes[key] = ({}, {})
+            if len(self._shapes) > CANDIDATE_CACHE_SHAPES:
+                self._shapes.popitem(last=False)
+        else:
+            self._shapes.move_to_end(key)
+        return entry
+
+    def positions(self, key: Tuple) -> Dict[Tuple[float, float], Optional[float]]:
+        """Cached (x, y) -> z of one shape key; read only, use store()."""
+        return self._entry(key)[0]
+
+    def store(self, key: Tuple, x, y, z: Optional[float]):
+        results, cells = self._entry(key)
+        if (x, y) not in results:
+            c = self.cell_mm
+            cells.setdefault((int(x // c), int(y // c)), []).append((x, y))
+        results[x, y] = z
+
+    def invalidate(self, box: Tuple):
+        """Drop every cached position whose footprint overlaps a new box."""
+        px, py, _, pl, pw, _ = box
+        c = self.cell_mm
+        for (length, width, *_), (results, cells) in self._shapes.items():
+            for cx in range(int((px - length) // c), int((px + pl) // c) + 1):
+                for cy in range(int((py - width) // c), int((py + pw) // c) + 1):
+                    listed = cells.get((cx, cy))
+                    if not listed:
+                        continue
+                    kept = []
+                    for x, y in listed:
+                        # Same overlap test as the support and collision checks
+                        if (
+                            x >= px + pl
+                            or x + length <= px
+                            or y >= py + pw
+                            or y + width <= py
+                        ):
+                            kept.append((x, y))
+                        else:
+                            del results[x, y]
+                    cells[cx, cy] = kept
+
+
+def covers(box: Tuple, x, y) -> bool:
+    """True if (x, y) lies strictly inside the box's footprint."""
+    px, py, _, pl, pw, _ = box
+    return px < x < px + pl and py < y < py + pw
+
+
+def box_extreme_points(box: Tuple) -> List[Tuple[float, float]]:
+    """Floor corners a placed box opens up for the next items.
+
+    The box's own origin (to stack on top), the corners beside and behind it,
+    and those corners projected back onto the container walls.
+    """
+    px, py, _, pl, pw, _ = box
+    return [
+        (px, py),
+        (px + pl, py),
+        (px, py + pw),
+        (px + pl, 0.0),
+        (0.0, py + pw),
+    ]
+
+
+@lru_cache(maxsize=1024)
+def grid_table(shapes, container_length, container_width):
+    """Grid positions for a set of orientations, with the orientations each fits.
+
+    Every orientation scans at most 200 mm steps; positions shared between
+    orientations are listed once so they are looked up only once.
+    """
+    table: Dict[Tuple[int, int], List[int]] = {}
+    for k, shape in enumerate(shapes):
+        step_x = min(200, shape.length_mm)
+        step_y = min(200, shape.width_mm)
+
+        for x in range(0, int(container_length - shape.length_mm + 1), int(step_x)):
+            for y in range(
+                0, int(container_width - shape.width_mm + 1), int(step_y)
+            ):
+                table.setdefault((x, y), []).append(k)
+    return tuple((pos, tuple(ks)) for pos, ks in table.items())
+
+
+def grid_positions(shapes, container, all_placements):
+    """Every floor position on a grid of at most 200 mm steps."""
+    return grid_table(shapes, container.length_mm, container.width_mm)
+
+
+def extreme_positions(shapes, container, all_placements):
+    """Floor positions at the extreme points left by placed boxes."""
+    if all_placements.extreme_points is not None:
+        points = all_placements.extreme_points
+    else:
+        points = {(0.0, 0.0)}
+        for row in range(len(all_placements.table)):
+            points.update(box_extreme_points(all_placements.table.box(row)))
+
+    for x, y in sorted(points):
+        ks = tuple(
+            k
+            for k, shape in enumerate(shapes)
+            if x + shape.length_mm <= container.length_mm
+            and y + shape.width_mm <= container.width_mm
+        )
+        if ks:
+            yield (x, y), ks
+
+
+CANDIDATE_STRATEGIES = {
+    "grid": grid_positions,
+    "extreme_points": extreme_positions,
+}
+
+
+def calculate_support_height(
+    x, y, width, length, boxes, min_ratio=MIN_SUPPORT_RATIO
+):
+    """Calculate height at which item should be placed based on items below.
+    Requires minimal support (at least 80% overlap) to prevent floating.
+    boxes are (x, y, z, l, w, h) tuples, as returned by near_boxes."""
+    max_height = 0.0
+
+    for px, py, pz, pl, pw, ph in boxes:
+        # Calculate overlap in X-Z plane (length-width); plain comparisons
+        # instead of min()/max() calls, this runs for every candidate
+        overlap_x_start = x if x > px else px
+        overlap_x_end = x + length if x + length < px + pl else px + pl
+        overlap_z_start = y if y > py else py  # y is width in our coordinate system
+        overlap_z_end = y + width if y + width < py + pw else py + pw
+
+        # Check if there's any overlap in the horizontal plane
+        if overlap_x_start < overlap_x_end and overlap_z_start < overlap_z_end:
+            overlap_area = (overlap_x_end - overlap_x_start) * (
+                overlap_z_end - overlap_z_start
+            )
+            item_area = length * width
+            support_ratio = overlap_area / item_area
+
+            # Require at least 80% support - prevents floating while allowing some flexibility
+            if support_ratio >= min_ratio and pz + ph > max_height:
+                max_height = pz + ph
+
+    return max_height
+
+
+def check_collision(x, y, z, length, width, height, boxes):
+    """Check if item would collide with existing boxes (x, y, z, l, w, h)."""
+    for px, py, pz, pl, pw, ph in boxes:
+        # Check overlap in all 3 dimensions
+        overlap_x = not (x >= px + pl or x + length <= px)
+        overlap_y = not (y >= py + pw or y + width <= py)
+        overlap_z = not (z >= pz + ph or z + height <= pz)
+
+        if overlap_x and overlap_y and overlap_z:
+            return True
+    return False
+
+
+def find_best_position(
+    item, container, all_placements, start_z, max_height, prefer_front, options=None
+):
+    """Find the best position: only stack with proper support, otherwise use floor.
+
+    Returns (x, y, z, orientation) or None. Every allowed orientation is tried;
+    the boxes around a position are looked up once and shared between them.
+    If the index has a candidate cache, positions evaluated by an earlier
+    search and not covered by a box since are reused instead of tested again.
+
+    Candidates are tested best first, in order of an upper bound on their
+    score, and the search stops at the first one whose exact score no
+    untested candidate can beat; the result is the same as scoring them all.
+    """
+    options = options or PackingOptions()
+    profile = ACTIVE_PROFILE.get()
+    if options.candidates not in CANDIDATE_STRATEGIES:
+        raise ValueError(f"Unknown candidate strategy: {options.candidates}")
+    positions = CANDIDATE_STRATEGIES[options.candidates]
+    if not isinstance(all_placements, PlacementIndex):
+        all_placements = PlacementIndex(all_placements)
+
+    # Orientations taller than the allowed height can never be placed
+    shapes = tuple(
+        o
+        for o in item_orientations(item, container, options)
+        if o.height_mm <= max_height
+    )
+    if not shapes:
+        return None
+    reach_x = max((o.length_mm for o in shapes), default=0)
+    reach_y = max((o.width_mm for o in shapes), default=0)
+
+    ratios = [required_support(item, o, options.support_ratio) for o in shapes]
+
+    # Evaluated positions of each orientation, kept by the index between searches
+    cache = all_placements.candidate_cache
+    keys = [
+        (o.length_mm, o.width_mm, o.height_mm, ratio, max_height)
+        for o, ratio in zip(shapes, ratios)
+    ]
+    cached = [cache.positions(key) if cache is not None else {} for key in keys]
+    hits = generated = tested = collisions = 0
+
+    # Score: prefer stacking with proper support, then (fragile passes) away
+    # from the door, then low positions; higher is better. Ties keep the
+    # item's own orientation over rotated ones, then the largest x, y.
+    bonus, hp = options.stacking_bonus, options.height_penalty
+    door_x = container.length_mm * 0.6
+
+    # Best first: candidates whose height is known without a support and
+    # collision test (cached, or nothing near them so they stand on the
+    # floor) are scored right away. The others go into a heap by an upper
+    # bound on their score, and are only tested while that bound can still
+    # beat the best (score, -k, x, y, z) found so far.
+    best = None
+    bounded = []
+    for (x, y), ks in positions(shapes, container, all_placements):
+        generated += len(ks)
+        fragile_penalty = 0
+        if prefer_front and x > door_x:
+            fragile_penalty = options.door_penalty
+        lowest = UNTESTED
+
+        for k in ks:
+            final_z = cached[k].get((x, y), UNTESTED)
+            if final_z is UNTESTED:
+                if lowest is UNTESTED:
+                    lowest = all_placements.lowest_top(x, y, reach_x, reach_y)
+                if lowest is not None:
+                    # Resting on a box means resting at least at its top;
+                    # on the floor there is no bonus, and z = 0 adds no height
+                    bound = max(
+                        bonus
+                        - fragile_penalty
+                        - (lowest if hp >= 0 else max_height) * hp,
+                        -fragile_penalty,
+                    )
+                    bounded.append((-bound, k, -x, -y))
+                    continue
+                final_z = 0.0
+            else:
+                hits += 1
+                if final_z is None:
+                    continue
+
+            stacking_bonus = bonus if final_z > 0.0 else 0
+            score = stacking_bonus - fragile_penalty - final_z * hp
+            found = (score, -k, x, y, final_z)
+            if best is None or found > best:
+                best = found
+
+    heapq.heapify(bounded)
+    nearby_at = {}
+    while bounded:
+        neg_bound, k, x, y = bounded[0]
+        if best is not None and (-neg_bound, -k, -x, -y) < best[:4]:
+            break  # neither this nor any later candidate can win
+        heapq.heappop(bounded)
+        x, y = -x, -y
+        shape = shapes[k]
+
+        # Only boxes around this footprint can support or block it; they are
+        # read out of the table once per position and shared by every orientation
+        nearby = nearby_at.get((x, y))
+        if nearby is None:
+            nearby = nearby_at[x, y] = all_placements.near_boxes(
+                x, y, reach_x, reach_y
+            )
+
+        # Height of the boxes giving proper support, otherwise 0.0 (floor)
+        tested += 1
+        final_z = calculate_support_height(
+            x,
+            y,
+            shape.width_mm,
+            shape.length_mm,
+            nearby,
+            ratios[k],
+        )
+
+        # Check height constraint, then collisions
+        too_high = final_z + shape.height_mm > max_height
+        collisions += not too_high
+        if too_high or check_collision(
+            x,
+            y,
+            final_z,
+            shape.length_mm,
+            shape.width_mm,
+            shape.height_mm,
+            nearby,
+        ):
+            final_z = None
+        if cache is not None:
+            cache.store(keys[k], x, y, final_z)
+        if final_z is None:
+            continue
+
+        fragile_penalty = 0
+        if prefer_front and x > door_x:
+            fragile_penalty = options.door_penalty
+        stacking_bonus = bonus if final_z > 0.0 else 0
+        score = stacking_bonus - fragile_penalty - final_z * hp
+        found = (score, -k, x, y, final_z)
+        if best is None or found > best:
+            best = found
+
+    if profile is not None:
+        profile.count("candidates", generated)
+        profile.count("support_tests", tested)
+        profile.count("collision_tests", collisions)
+        if hits:
+            profile.count("candidate_cache_hits", hits)
+
+    if best is None:
+        return None
+    _, neg_k, x, y, z = best
+    return (x, y, z, shapes[-neg_k])
+
+
+def fits_remaining(item, shapes, max_height, free_volume, free_weight) -> bool:
+    """O(1) bound check of an item against what is left of a container.
+
+    False means no position search can succeed: no orientation fits the
+    container, or the item needs more height, volume or payload than is left.
+    """
+    return (
+        bool(shapes)
+        and item.weight_kg <= free_weight + 1e-9
+        and item.volume() <= free_volume + 1e-6
+        and min(o.height_mm for o in shapes) <= max_height
+    )
+
+
+def placement_index(container, table: PlacementTable, options):
+    """The engine's view of a container's placements, kept up to date by add().
+
+    A HeightMap for the height-map engine; for the reference engine a
+    PlacementIndex with a candidate cache, so it pays to keep one across
+    passes over the same container.
+    """
+    if options.engine == "heightmap":
+        from heightmap import HeightMap
+
+        return HeightMap(
+            container,
+            options.heightmap_resolution_mm,
+            table,
+            (options.stacking_bonus, options.door_penalty, options.height_penalty),
+        )
+    if options.engine == "reference":
+        return PlacementIndex(
+            table,
+            extreme_points=options.candidates == "extreme_points",
+            candidate_cache=True,
+        )
+    raise ValueError(f"Unknown packing engine: {options.engine}")
+
+
+def shelf_pack(
+    items,
+    container,
+    start_z=0.0,
+    start_order=1,
+    max_height=None,
+    prefer_front=False,
+    existing_placements=None,
+    options=None,
+    all_placements=None,
+):
+    """3D packing that prioritizes stacking over floor coverage.
+
+    New placements are appended to existing_placements (a PlacementTable)
+    and also returned as a table of their own. all_placements is the
+    placement_index() over that table to keep using, e.g. from an earlier
+    pass; a new one is built if it is not given.
+    """
+    table = PlacementTable.of(existing_placements)
+    first = len(table)
+    leftover = []
+    order = start_order
+    max_height = max_height or container.height_mm
+    options = options or PackingOptions()
+    profile = ACTIVE_PROFILE.get()
+    if all_placements is None:
+        all_placements = placement_index(container, table, options)
+
+    # What is left of the container, for the O(1) screen of each item
+    free_volume = container_volume(container) - table.volume()
+    free_weight = container.max_weight_kg - table.total_weight()
+
+    queue = deque(items)
+    while queue:
+        item = queue.popleft()
+
+        if options.deadline is not None and time.time() > options.deadline:
+            # Out of time: everything not placed yet is left over, as units
+            for rest in [item, *queue]:
+                leftover.extend(rest.units if isinstance(rest, ItemBlock) else [rest])
+            break
+
+        shapes = item_orientations(item, container, options)
+        fits = fits_remaining(item, shapes, max_height, free_volume, free_weight)
+        if profile is not None:
+            profile.count("bound_checks")
+            profile.count("bound_rejections", not fits)
+            profile.count("position_searches", fits)
+        if not fits:
+            pos = None
+        # Find best position for this item
+        elif options.engine == "heightmap":
+            pos = all_placements.best_position(
+                shapes,
+                max_height,
+                prefer_front,
+                [required_support(item, o, options.support_ratio) for o in shapes],
+            )
+        else:
+            pos = find_best_position(
+                item,
+                container,
+                all_placements,
+                start_z,
+                max_height,
+                prefer_front,
+                options,
+            )
+
+        if pos is None:
+            # A block that does not fit is retried as two smaller blocks
+            if isinstance(item, ItemBlock):
+                queue.extendleft(reversed(item.split()))
+            else:
+                leftover.append(item)
+            continue
+
+        x, y, z, shape = pos
+
+        # Place item
+        rows = len(table)
+        if isinstance(item, Pallet):
+            # Deck and cartons, so what comes next sees the load's real top
+            item.expand(table, x, y, z, shape.code, order)
+        else:
+            table.append(
+                item.name,
+                x,
+                y,
+                z,
+                shape.length_mm,
+                shape.width_mm,
+                shape.height_mm,
+                shape.code,
+                order,
+                item.fragile,
+                item if isinstance(item, ItemBlock) else None,
+                item.weight_kg,
+                item.order_id,
+            )
+        for row in range(rows, len(table)):
+            free_volume -= table.l[row] * table.w[row] * table.h[row]
+            if options.engine == "heightmap":
+                all_placements.add(*table.box(row))
+            else:
+                all_placements.add(row)
+        free_weight -= item.weight_kg
+        order += 1
+
+    # Calculate actual used height
+    used_height = start_z
+    if len(table) > first:
+        used_height = max(table.z[i] + table.h[i] for i in range(first, len(table)))
+
+    return table.tail(first), used_height, leftover
+
+
+@lru_cache(maxsize=1)
+def tiling_library():
+    """The precomputed floor-tiling library (see tiling.py), None if not built."""
+    from tiling import LIBRARY_PATH, TilingLibrary
+
+    path = TILING_LIBRARY_PATH or LIBRARY_PATH
+    if not os.path.exists(path):
+        return None
+    return TilingLibrary.load(path)
+
+
+def seed_layers(container, items, table: PlacementTable, index, options):
+    """Lay whole floor layers of the heaviest product from the tiling library.
+
+    Only on an empty floor, and only for a non-fragile product with at least
+    one full layer of units: those layers are placed as the stored pattern,
+    without a position search. Returns (items to pack on and around them,
+    leftover); once the pattern fills the container to the roof, the other
+    units of that product are left over rather than searched for a gap.
+    """
+    library = tiling_library()
+    loose = [i for i in items if type(i) is PackingItem and not i.fragile]
+    if library is None or len(table) or not loose:
+        return items, []
+
+    unit = max(loose, key=lambda i: i.weight_kg)
+    pattern = library.get(unit, container)
+    if pattern is None or (
+        not options.rotation and any(code != "lwh" for _, _, code in pattern.tiles)
+    ):
+        return items, []
+
+    group = [
+        k
+        for k, i in enumerate(items)
+        if type(i) is PackingItem and item_key(i) == item_key(unit)
+    ]
+    same = set(group)
+    layers = min(pattern.layers, len(group) // pattern.per_layer)
+    if unit.weight_kg > 0:
+        layer_weight = unit.weight_kg * pattern.per_layer
+        layers = min(layers, int(container.max_weight_kg // layer_weight))
+    if layers <= 0:
+        return items, []
+
+    # One block per tile, its units stacked through every seeded layer
+    seeded = group[: layers * pattern.per_layer]
+    dims = (unit.length_mm, unit.width_mm, unit.height_mm)
+    for t, (x, y, code) in enumerate(pattern.tiles):
+        stack = [items[k] for k in seeded[t :: pattern.per_layer]]
+        counts = [1, 1, 1]
+        counts[AXIS[code[2]]] = layers
+        block = stack[0] if layers == 1 else ItemBlock.of(stack, tuple(counts))
+        l, w, h = (dims[AXIS[a]] for a in code)
+        row = table.append(
+            block.name,
+            x,
+            y,
+            0.0,
+            l,
+            w,
+            h * layers,
+            code,
+            len(table) + 1,
+            block.fragile,
+            block if layers > 1 else None,
+            block.weight_kg,
+            block.order_id,
+        )
+        if options.engine == "heightmap":
+            index.add(*table.box(row))
+        else:
+            index.add(row)
+
+    profile = ACTIVE_PROFILE.get()
+    if profile is not None:
+        profile.count("tiled_units", len(seeded))
+    taken = set(seeded)
+    full = layers == pattern.layers
+    rest, leftover = [], []
+    for k in range(len(items)):
+        if k not in taken:
+            (leftover if full and k in same else rest).append(items[k])
+    return rest, leftover
+
+
+def pack_items_in_container(container, items, options=None, existing_placements=None):
+    """Pack items into a single container with gravity support.
+
+    existing_placements are boxes already loaded in the container; the new
+    items are packed around them and only the new placements are returned.
+    """
+    options = options or PackingOptions()
+
+    placements = PlacementTable()
+    if existing_placements is not None:
+        placements.extend(PlacementTable.of(existing_placements))
+    preloaded = len(placements)
+    # One index for every pass, so evaluated positions carry over between them
+    index = placement_index(container, placements, options)
+    leftover_total = []
+
+    if options.tiling and not preloaded:
+        items, leftover_total = seed_layers(
+            container, items, placements, index, options
+        )
+    placement_order = len(placements) + 1
+
+    if options.blocks:
+        items = build_blocks(items, container)
+
+    # Sort weights by position: the units of a product may be one shared object
+    weights = [item.unit_weight_kg() for item in items]
+    if options.order_seed is not None:
+        rnd = random.Random(options.order_seed)
+        jitter = [1 + ORDER_JITTER * rnd.uniform(-1, 1) for _ in items]
+        weights = [w * f for w, f in zip(weights, jitter)]
+
+    ranked = [
+        item
+        for item, _ in sorted(zip(items, weights), key=lambda p: p[1], reverse=True)
+    ]
+    fragile = [i for i in ranked if i.fragile]
+    non_fragile = [i for i in ranked if not i.fragile]
+
+    heavy, medium = [], []
+    if non_fragile:
+        # Median over units, so a block weighs in once per unit it holds
+        weights = [
+            i.unit_weight_kg() for i in non_fragile for _ in range(i.unit_count())
+        ]
+        median_weight = sorted(weights)[len(weights) // 2]
+        heavy = [i for i in non_fragile if i.unit_weight_kg() >= median_weight]
+        medium = [i for i in non_fragile if i.unit_weight_kg() < median_weight]
+
+    used_height = 0.0
+
+    # Pack heavy items at bottom
+    if heavy:
+        heavy_res, used_height, leftover_h = run_phase(
+            "heavy",
+            heavy,
+            container,
+            used_height,
+            placement_order,
+            None,
+            False,
+            placements,
+            options,
+            index,
+        )
+        leftover_total.extend(leftover_h)
+        placement_order += len(heavy_res)
+
+    # Pack medium items on top of heavy items
+    if medium:
+        mid_res, used_height, leftover_m = run_phase(
+            "medium",
+            medium,
+            container,
+            used_height,
+            placement_order,
+            None,
+            False,
+            placements,
+            options,
+            index,
+        )
+        leftover_total.extend(leftover_m)
+        placement_order += len(mid_res)
+
+    # Pack fragile items on top (door preference relaxed for space efficiency)
+    if fragile:
+        f_res, _, leftover_f = run_phase(
+            "fragile",
+            fragile,
+            container,
+            used_height,
+            placement_order,
+            None,
+            True,
+            placements,
+            options,
+            index,
+        )
+
+        # If fragile items couldn't fit due to door preference, try again without preference
+        if leftover_f:
+            f_res2, _, leftover_f = run_phase(
+                "fragile_retry",
+                leftover_f,
+                container,
+                used_height,
+                placement_order + len(f_res),
+                None,
+                False,
+                placements,
+                options,
+                index,
+            )
+        leftover_total.extend(leftover_f)
+
+    return expand_blocks(placements.tail(preloaded), preloaded + 1), leftover_total
+
+
+def bounds_violations(
+    placements: PlacementTable, container
+) -> List[Tuple[bool, ...]]:
+    """Per placement: (negative position, too long, too wide, too high).
+
+    Vectorized with NumPy (straight over the table columns) when it is
+    installed, plain Python otherwise.
+    """
+    limits = (container.length_mm, container.width_mm, container.height_mm)
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is None or not len(placements):
+        flags = []
+        for i in range(len(placements)):
+            x, y, z, l, w, h = placements.box(i)
+            flags.append(
+                (
+                    x < 0 or y < 0 or z < 0,
+                    x + l > limits[0],
+                    y + w > limits[1],
+                    z + h > limits[2],
+                )
+            )
+        return flags
+
+    x, y, z, l, w, h = (
+        np.frombuffer(getattr(placements, c))
+        for c in ("x", "y", "z", "l", "w", "h")
+    )
+    negative = (x < 0) | (y < 0) | (z < 0)
+    return list(
+        zip(
+            negative.tolist(),
+            (x + l > limits[0]).tolist(),
+            (y + w > limits[1]).tolist(),
+            (z + h > limits[2]).tolist(),
+        )
+    )
+
+
+def overlapping_pairs(placements: PlacementTable) -> List[Tuple[int, int]]:
+    """Index pairs (i < j) of boxes that overlap, by sweeping along the length.
+
+    Boxes are visited in order of x; only boxes whose x range is still open
+    are compared, so stacks far apart along the truck are never paired up.
+    """
+    order = sorted(range(len(placements)), key=placements.x.__getitem__)
+    open_boxes: List[Tuple[float, int]] = []  # heap of (x end, index)
+    pairs = []
+
+    for i in order:
+        x1, y1, z1, l1, w1, h1 = placements.box(i)
+
+        while open_boxes and open_boxes[0][0] <= x1:
+            heapq.heappop(open_boxes)
+
+        for _, j in open_boxes:
+            x2, y2, z2, l2, w2, h2 = placements.box(j)
+            overlap_y = not (y1 + w1 <= y2 or y2 + w2 <= y1)
+            overlap_z = not (z1 + h1 <= z2 or z2 + h2 <= z1)
+            if overlap_y and overlap_z and x1 + l1 > x2:
+                pairs.append((min(i, j), max(i, j)))
+
+        heapq.heappush(open_boxes, (x1 + l1, i))
+
+    pairs.sort()
+    return pairs
+
+
+def supported_share(row: int, index: PlacementIndex) -> float:
+    """Share of a box's base resting on the tops of boxes directly below it."""
+    x, y, z, l, w, _ = index.table.box(row)
+    if z <= 0:
+        return 1.0
+
+    area = 0.0
+    for px, py, pz, pl, pw, ph in index.near_boxes(x, y, l, w):
+        if abs(pz + ph - z) > 1e-6:
+            continue
+        overlap_x = min(x + l, px + pl) - max(x, px)
+        overlap_y = min(y + w, py + pw) - max(y, py)
+        if overlap_x > 0 and overlap_y > 0:
+            area += overlap_x * overlap_y
+    return area / (l * w)
+
+
+def validate_packing(placements, container, options=None) -> List[str]:
+    """Validate packing for overlaps, bounds violations and floating items.
+
+    Takes a PlacementTable or a list of placement dicts.
+    """
+    started = time.perf_counter()
+    options = options or PackingOptions()
+    placements = PlacementTable.of(placements)
+    names = placements.names
+    errors = []
+
+    flags = bounds_violations(placements, container)
+    pairs = overlapping_pairs(placements)
+    next_pair = 0
+
+    for i in range(len(placements)):
+        # Check bounds
+        x1, y1, z1 = placements.position(i)
+        negative, too_long, too_wide, too_high = flags[i]
+
+        if negative:
+            errors.append(f"Item {names[i]} has negative position: ({x1}, {y1}, {z1})")
+
+        if too_long:
+            errors.append(f"Item {names[i]} exceeds container length")
+        if too_wide:
+            errors.append(f"Item {names[i]} exceeds container width")
+        if too_high:
+            errors.append(f"Item {names[i]} exceeds container height")
+
+        # Overlaps with later items, found by the sweep
+        while next_pair < len(pairs) and pairs[next_pair][0] == i:
+            j = pairs[next_pair][1]
+            x2, y2, z2 = placements.position(j)
+            errors.append(
+                f"Overlap detected: {names[i]} at ({x1},{y1},{z1}) and {names[j]} at ({x2},{y2},{z2})"
+            )
+            next_pair += 1
+
+    # Check support
+    index = PlacementIndex(placements)
+    for i in range(len(placements)):
+        share = supported_share(i, index)
+        if share < options.support_ratio - 1e-9:
+            errors.append(
+                f"Item {names[i]} is floating: {share:.0%} of its base is supported "
+                f"(minimum {options.support_ratio:.0%})"
+            )
+
+    # Check payload
+    load = placements.total_weight()
+    if load > container.max_weight_kg + 1e-6:
+        errors.append(
+            f"Load of {load:.1f} kg exceeds container max weight "
+            f"of {container.max_weight_kg} kg"
+        )
+
+    profile = ACTIVE_PROFILE.get()
+    if profile is not None:
+        profile.count("validate_calls")
+        profile.add_time("validate", time.perf_counter() - started)
+    return errors
+
+
+def container_volume(container) -> float:
+    return container.length_mm * container.width_mm * container.height_mm
+
+
+def run_phase(phase: str, *args):
+    """One shelf_pack pass of pack_items_in_container, timed when profiling."""
+    profile = ACTIVE_PROFILE.get()
+    if profile is None:
+        return shelf_pack(*args)
+    start = time.perf_counter()
+    result = shelf_pack(*args)
+    profile.count(f"passes.{phase}")
+    profile.add_time(f"phase.{phase}", time.perf_counter() - start)
+    return result
+
+
+def item_key(item: PackingItem) -> Tuple:
+    return (
+        item.length_mm,
+        item.width_mm,
+        item.height_mm,
+        item.weight_kg,
+        item.fragile,
+        item.upright,
+    )
@@ -0,0 +1,101 @@
+"""
+Pallets mode
+Cartons are packed onto pallets first, then the pallets into the vehicles
+"""
+
+from dataclasses import replace
+from typing import Dict, List, Tuple
+
+from fleet import assign_fleet, fill_room, pack_into_fleet, unit_fits
+from packing import (
+    PALLET_DECK_MM,
+    PALLET_NAME,
+    PackingContainer,
+    PackingItem,
+    Pallet,
+    container_volume,
+    item_key,
+)
+
+
+def palletize(items, container_objs, options) -> List[PackingItem]:
+    """First level of the pallets mode: pack the cartons onto pallets.
+
+    Whole orders are assigned to pallets and every pallet is packed as a
+    sub-problem of its own, in parallel: assign_fleet over a stack of pallet
+    containers. The pallets are then packed into the vehicles like any other
+    item. Cartons that fit no pallet go into the vehicles loose, and nothing
+    is palletized if no vehicle takes a pallet.
+
+    Returns the loaded pallets followed by the loose cartons.
+    """
+    length, width, height = options.pallet_mm
+    # A loaded pallet must still fit the tallest vehicle
+    tallest = max((c.height_mm for c in container_objs), default=0.0)
+    pallet = PackingContainer(
+        id="pallet",
+        length_mm=length,
+        width_mm=width,
+        height_mm=min(height, tallest - PALLET_DECK_MM),
+        max_weight_kg=options.pallet_max_weight_kg,
+    )
+    footprint = sorted((length, width))
+    if pallet.height_mm <= 0 or not any(
+        footprint[0] <= min(c.length_mm, c.width_mm)
+        and footprint[1] <= max(c.length_mm, c.width_mm)
+        for c in container_objs
+    ):
+        return items
+
+    fits: Dict[Tuple, bool] = {}
+    cartons, loose = [], []
+    for item in items:
+        key = item_key(item)
+        if key not in fits:
+            fits[key] = unit_fits(item, pallet, options)
+        (cartons if fits[key] else loose).append(item)
+
+    # One pallet per carton is always enough; only the planned ones are used
+    stack = [replace(pallet, id=f"pallet-{k + 1}") for k in range(len(cartons))]
+    packed, rest = assign_fleet(
+        cartons, stack, replace(options, fleet_search="assign", restarts=0)
+    )
+    units = {(carton.name, carton.order_id): carton for carton in cartons}
+    pallets = [
+        Pallet.of(f"{PALLET_NAME}-{k + 1}", length, width, placements, units)
+        for k, (_, placements) in enumerate(packed)
+    ]
+    return pallets + loose + rest
+
+
+def unload_pallets(packed, items, container_objs, options):
+    """Pallets no vehicle took go in as loose cartons instead.
+
+    The cartons are packed into the room left in the loaded vehicles, then
+    into unused ones, by the height-map engine: they can be thousands of
+    units, and a unit-by-unit reference search would cost more than the
+    pallets saved. Returns (packed, unplaced) like pack_into_fleet.
+    """
+    cartons = unpalletize(i for i in items if isinstance(i, Pallet))
+    if not cartons:
+        return packed, items
+
+    options = replace(options, engine="heightmap")
+    packed = [run for run in packed if len(run[1])]
+    cartons = fill_room(packed, cartons, options)
+    used = {id(container) for container, _ in packed}
+    spare = sorted(
+        (c for c in container_objs if id(c) not in used), key=container_volume
+    )
+    extra, cartons = pack_into_fleet(cartons, spare, options)
+    packed.extend(run for run in extra if len(run[1]))
+    return packed, [i for i in items if not isinstance(i, Pallet)] + cartons
+
+
+def unpalletize(items) -> List[PackingItem]:
+    """Items with every pallet replaced by its cartons."""
+    return [
+        carton
+        for item in items
+        for carton in (item.cartons() if isinstance(item, Pallet) else [item])
+    ]
@@ -0,0 +1,101 @@
+"""
+Packing profiles
+Counters and phase timers of a packing run, collected per context and
+brought home from pool workers
+"""
+
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Profile of the packing run in progress in this context (thread, task or
+# pool worker), None when profiling is off
+ACTIVE_PROFILE: ContextVar[Optional["PackingProfile"]] = ContextVar(
+    "packing_profile", default=None
+)
+
+
+class PackingProfile:
+    """Counters and timers of one packing run.
+
+    Counters: candidates (position × orientation pairs generated),
+    support_tests, collision_tests, candidate_cache_hits (pairs answered by
+    the CandidateCache), tiled_units (units laid by seed_layers),
+    position_searches, bound_checks and
+    bound_rejections (fits_remaining), validations, and passes per
+    pack_items_in_container phase (heavy, medium, fragile, fragile_retry).
+    Timers (seconds): one per phase, plus validate. Time spent in pool
+    workers is summed over the workers, so it may exceed the wall time.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.timers: Dict[str, float] = {}
+
+    def count(self, name: str, n: int = 1):
+        if n:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name: str, seconds: float):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def merge(self, other: "PackingProfile"):
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for name, seconds in other.timers.items():
+            self.add_time(name, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "timers_s": {k: round(v, 4) for k, v in sorted(self.timers.items())},
+        }
+
+
+class profiling:
+    """Collect a PackingProfile while the block runs.
+
+    The engine counts into the profile of its own context, so concurrent
+    runs (profiled or not) never count into each other's profile. Nested
+    blocks count into the innermost profile.
+    """
+
+    def __init__(self, profile: PackingProfile):
+        self.profile = profile
+
+    def __enter__(self) -> PackingProfile:
+        self.token = ACTIVE_PROFILE.set(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc):
+        ACTIVE_PROFILE.reset(self.token)
+        return False
+
+
+def run_profiled(fn, *args):
+    """Pool worker side of pool_map: run fn under a fresh profile."""
+    with profiling(PackingProfile()) as profile:
+        return fn(*args), profile
+
+
+def pool_map(pool, fn, *iterables) -> List:
+    """pool.map that brings the workers' profiles home when profiling."""
+    active = ACTIVE_PROFILE.get()
+    if active is None:
+        return list(pool.map(fn, *iterables))
+    results = []
+    for result, profile in pool.map(
+        run_profiled, [fn] * len(iterables[0]), *iterables
+    ):
+        active.merge(profile)
+        results.append(result)
+    return results
+
+
+def log_event(event: str, **fields):
+    """Emit one structured (JSON) log line."""
+    logger.info(json.dumps({"event": event, **fields}, default=str))
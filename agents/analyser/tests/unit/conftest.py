@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The analyser's modules are scripts next to agent.py, not a package
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
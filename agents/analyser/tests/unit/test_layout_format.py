@@ -0,0 +1,73 @@
+"""Columnar layout format: to_columnar and from_columnar give layouts back"""
+
+import json
+import os
+
+import pytest
+
+from agent import (
+    choose_containers_and_pack,
+    decode_layout_object,
+    encode_layout_object,
+    from_columnar,
+    prepare_commodities_batch,
+    to_columnar,
+    transform_to_ui_format,
+)
+from benchmark import VEHICLES, make_batch
+
+# Shared with the viewers' layoutFormat.check.js
+FIXTURES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    *[os.pardir] * 4,
+    "control-panel",
+    "src",
+    "utils",
+    "fixtures",
+)
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def vehicles():
+    commodities = prepare_commodities_batch(make_batch("mixed", 150))
+    return transform_to_ui_format(choose_containers_and_pack(commodities, VEHICLES))[
+        "containers"
+    ]
+
+
+def test_fixtures_round_trip():
+    columnar = fixture("layout-columnar.json")
+    packages = fixture("layout-packages.json")
+
+    assert from_columnar(columnar) == packages
+    assert to_columnar(packages) == columnar
+
+
+def test_packed_vehicles_round_trip(vehicles):
+    for vehicle in vehicles:
+        columnar = to_columnar(vehicle)
+
+        assert columnar is not None
+        assert from_columnar(columnar) == vehicle
+        assert decode_layout_object(encode_layout_object(columnar)[0]) == vehicle
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda pkg: pkg.update(note="fragile side up"),
+        lambda pkg: pkg["position"].update(x=pkg["position"]["x"] + 0.0001),
+        lambda pkg: pkg.update(id="custom-id"),
+    ],
+    ids=["extra field", "sub-micron position", "custom id"],
+)
+def test_lossy_vehicles_stay_packages(vehicles, change):
+    vehicle = json.loads(json.dumps(vehicles[0]))
+    change(vehicle["packages"][0])
+
+    assert to_columnar(vehicle) is None
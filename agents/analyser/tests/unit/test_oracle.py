@@ -0,0 +1,21 @@
+"""Oracle invariants: no engine or fleet search lays out an invalid load"""
+
+import pytest
+
+from oracle import ENGINES, FLEET_SEARCHES, check_fleet_searches, compare_engines
+
+
+@pytest.mark.parametrize("engine", [name for name in ENGINES if name != "reference"])
+def test_engine_layouts_are_valid(engine):
+    report = compare_engines(12, seed=0, engines=[engine], max_units=80)
+
+    assert report["reference"]["invalid"] == []
+    assert report[engine]["invalid"] == []
+
+
+@pytest.mark.parametrize("search", list(FLEET_SEARCHES))
+def test_fleet_search_layouts_are_valid(search):
+    report = check_fleet_searches(4, seed=0, searches=[search], max_units=150)
+
+    assert report[search]["invalid"] == []
+    assert report[search]["placed"] > 0
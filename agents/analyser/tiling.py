@@ -0,0 +1,266 @@
+"""
+Floor-tiling library
+Precomputes the densest single-product layer pattern for every product ×
+vehicle pair, so the packer can lay whole layers of a product without a
+position search
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+LIBRARY_PATH = os.path.join(os.path.dirname(__file__), "tiling_library.json")
+
+# Footprint axes and the axis left standing, for each way a layer can lie.
+# Upright products only use the first one.
+LAYER_AXES = (("l", "w", "h"), ("l", "h", "w"), ("w", "h", "l"))
+
+
+class TilePattern(NamedTuple):
+    """One layer of a product on a vehicle floor, repeated `layers` times.
+
+    tiles are (x, y, code) floor offsets with the orientation code of the
+    unit there (see ORIENTATION_CODES in agent.py).
+    """
+
+    per_layer: int
+    layers: int
+    layer_height_mm: float
+    tiles: Tuple[Tuple[float, float, str], ...]
+
+    def units(self) -> int:
+        return self.per_layer * self.layers
+
+
+def shape_key(length, width, height, upright, container_dims) -> str:
+    """Library key of a product shape on a vehicle of the given dimensions."""
+    dims = "x".join(f"{float(v):g}" for v in (length, width, height))
+    floor = "x".join(f"{float(v):g}" for v in container_dims)
+    return f"{dims}{'/upright' if upright else ''}@{floor}"
+
+
+def strip_tiling(a, b, length, width) -> List[Tuple[float, float, bool]]:
+    """Densest tiling of a × b footprints on a length × width floor by strips.
+
+    The floor is cut across its length into strips of whole columns, each in
+    one of the two turns of the footprint; the gap a strip leaves at the side
+    is filled with turned footprints. Returns (x, y, turned) per tile.
+    """
+    def rest_after(i, j):
+        """Length left after i columns a long and j columns b long."""
+        return round(length - i * a - j * b, 6)
+
+    # Best (count, strips) for every length the strips can leave over,
+    # shortest first so the rest of every cut is already solved. Each rest
+    # keeps the columns that first left it, and a cut's rest is worked out
+    # from those column counts: subtracting from the rounded rest drifts
+    # off the stored keys with fractional sizes.
+    cuts: Dict[float, Tuple[int, int]] = {}
+    for i in range(int(length // a) + 1):
+        for j in range(int((length - i * a) // b) + 1):
+            cuts.setdefault(rest_after(i, j), (i, j))
+    best: Dict[float, Tuple[int, Tuple]] = {}
+    for rest in sorted(cuts):
+        i, j = cuts[rest]
+        found = (0, ())
+        for turned in (False, True):
+            l, w = (b, a) if turned else (a, b)
+            if l > rest or w > width:
+                continue
+            rows = int(width // w)
+            spare = width - rows * w
+            for columns in range(1, int(rest // l) + 1):
+                side = int(columns * l // w) * int(spare // l)
+                cut = (i, j + columns) if turned else (i + columns, j)
+                # A cut that only fits by rounding leaves nothing to tile
+                count, plan = best.get(rest_after(*cut), (0, ()))
+                count += columns * rows + side
+                if count > found[0]:
+                    found = (count, ((turned, columns),) + plan)
+        best[rest] = found
+
+    tiles, x = [], 0.0
+    for turned, columns in best[round(length, 6)][1]:
+        l, w = (b, a) if turned else (a, b)
+        rows = int(width // w)
+        tiles.extend(
+            (x + i * l, j * w, turned) for i in range(columns) for j in range(rows)
+        )
+        side_rows = int((width - rows * w) // l)
+        tiles.extend(
+            (x + i * w, rows * w + j * l, not turned)
+            for i in range(int(columns * l // w))
+            for j in range(side_rows)
+        )
+        x += columns * l
+    return tiles
+
+
+def layer_tiling(a, b, length, width) -> List[Tuple[float, float, bool]]:
+    """Best strip tiling with strips across the length or across the width."""
+    along = strip_tiling(a, b, length, width)
+    across = [(x, y, turned) for y, x, turned in strip_tiling(b, a, width, length)]
+    return along if len(along) >= len(across) else across
+
+
+def best_pattern(
+    length, width, height, upright, container_dims
+) -> Optional[TilePattern]:
+    """The layer pattern that puts the most units of a product in a vehicle.
+
+    Ties go to the pattern that keeps the product upright.
+    """
+    dims = {"l": length, "w": width, "h": height}
+    cl, cw, ch = container_dims
+    best = None
+    for first, second, up in LAYER_AXES[:1] if upright else LAYER_AXES:
+        layers = int(ch // dims[up])
+        if not layers:
+            continue
+        tiles = layer_tiling(dims[first], dims[second], cl, cw)
+        if not tiles:
+            continue
+        pattern = TilePattern(
+            per_layer=len(tiles),
+            layers=layers,
+            layer_height_mm=dims[up],
+            tiles=tuple(
+                (x, y, (second + first if turned else first + second) + up)
+                for x, y, turned in tiles
+            ),
+        )
+        if best is None or pattern.units() > best.units():
+            best = pattern
+    return best
+
+
+class TilingLibrary:
+    """Layer patterns indexed by product shape and vehicle dimensions.
+
+    Products of the same shape share an entry, so the packer finds the
+    pattern of an item with one dict lookup, whatever product it came from.
+    """
+
+    def __init__(
+        self, patterns: Optional[Dict[str, TilePattern]] = None, digest: str = ""
+    ):
+        self.patterns = patterns or {}
+        # Hash of the stored file, so cached layouts follow a rebuilt library
+        self.digest = digest
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def get(self, item, container) -> Optional[TilePattern]:
+        """Pattern of a PackingItem on a PackingContainer, if precomputed."""
+        return self.lookup(
+            item.length_mm,
+            item.width_mm,
+            item.height_mm,
+            item.keeps_upright(),
+            (container.length_mm, container.width_mm, container.height_mm),
+        )
+
+    def lookup(
+        self, length, width, height, upright, container_dims
+    ) -> Optional[TilePattern]:
+        """Pattern of a product shape on a vehicle, if precomputed."""
+        return self.patterns.get(
+            shape_key(length, width, height, upright, container_dims)
+        )
+
+    def add(self, length, width, height, upright, container_dims) -> bool:
+        """Compute and store the pattern of one product × vehicle pair."""
+        key = shape_key(length, width, height, upright, container_dims)
+        if key not in self.patterns:
+            pattern = best_pattern(length, width, height, upright, container_dims)
+            if pattern is None:
+                return False
+            self.patterns[key] = pattern
+        return True
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(
+                {key: p._asdict() for key, p in sorted(self.patterns.items())},
+                f,
+                separators=(",", ":"),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "TilingLibrary":
+        with open(path, "rb") as f:
+            data = f.read()
+        stored = json.loads(data)
+        return cls(
+            {
+                key: TilePattern(
+                    p["per_layer"],
+                    p["layers"],
+                    p["layer_height_mm"],
+                    tuple((x, y, code) for x, y, code in p["tiles"]),
+                )
+                for key, p in stored.items()
+            },
+            hashlib.sha256(data).hexdigest(),
+        )
+
+
+def build_library(products: Iterable[Dict], vehicles: Iterable[Dict]) -> TilingLibrary:
+    """Patterns for every product (Order API shape) on every vehicle.
+
+    vehicles are dicts with length_mm, width_mm and height_mm, as returned
+    by fetch_available_vehicles. Fragile products are kept upright.
+    """
+    library = TilingLibrary()
+    floors = {(v["length_mm"], v["width_mm"], v["height_mm"]) for v in vehicles}
+    for product in products:
+        for floor in sorted(floors):
+            library.add(
+                product["length"],
+                product["width"],
+                product["height"],
+                bool(product.get("fragility", False)),
+                floor,
+            )
+    return library
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--products", help="Products JSON (default: the Order API catalog)"
+    )
+    parser.add_argument(
+        "--vehicles", help="Vehicles JSON (default: the transport API fleet)"
+    )
+    parser.add_argument("--out", default=LIBRARY_PATH, help="Library file to write")
+    args = parser.parse_args()
+
+    if args.products:
+        with open(args.products) as f:
+            products = json.load(f)
+    else:
+        import requests
+
+        from agent import ORDER_API_URL
+
+        products = requests.get(f"{ORDER_API_URL}/products/").json()
+
+    if args.vehicles:
+        with open(args.vehicles) as f:
+            vehicles = json.load(f)
+    else:
+        from agent import fetch_available_vehicles
+
+        vehicles = fetch_available_vehicles()
+
+    library = build_library(products, vehicles)
+    library.save(args.out)
+    print(f"{len(library)} patterns for {len(products)} products written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
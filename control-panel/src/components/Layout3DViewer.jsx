@@ -1,19 +1,39 @@
 import React, { useState, useEffect } from 'react';
 import { X, Maximize2, Minimize2, RotateCw, Loader2, Package, Box } from 'lucide-react';
 import { config } from '../utils/config';
+import { expandLayout } from '../utils/layoutFormat';
 import ThreeJSViewer from './ThreeJSViewer';
 
 export default function Layout3DViewer({ booking, onClose }) {
   const [isFullscreen, setIsFullscreen] = useState(false);
   const [layoutData, setLayoutData] = useState(null);
+  const [manifest, setManifest] = useState(null);
+  const [vehicleIndex, setVehicleIndex] = useState(0);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    loadLayoutData();
+    setVehicleIndex(0);
+    loadLayoutData(0);
   }, [booking]);
 
-  const loadLayoutData = async () => {
+  const fetchLayout = async (query) => {
+    // The API only passes gzip bodies through as binary for this media type
+    const response = await fetch(`${config.layoutApiUrl}/layouts?${query}`, {
+      headers: { Accept: 'application/json' },
+    });
+
+    if (!response.ok) {
+      throw new Error('Layout not found');
+    }
+
+    // The browser undoes the gzip Content-Encoding; columnar vehicle
+    // layouts are expanded to package objects here
+    return expandLayout(await response.json());
+  };
+
+  // A manifest already loaded for this booking is not fetched again
+  const loadLayoutData = async (index = vehicleIndex, knownManifest = null) => {
     setIsLoading(true);
     setError(null);
 
@@ -22,19 +42,20 @@ export default function Layout3DViewer({ booking, onClose }) {
         throw new Error('No layout available for this booking');
       }
 
-      // Fetch layout data from Lambda API
-      const layoutUrl = `${config.layoutApiUrl}/layouts?key=${booking.s3LayoutKey}`;
-      const response = await fetch(layoutUrl);
-
-      if (!response.ok) {
-        throw new Error('Layout not found');
+      // Fetch layout data from Lambda API. Layouts are a manifest with one
+      // object per vehicle, so only the vehicle on display is downloaded.
+      const data = knownManifest || (await fetchLayout(`key=${booking.s3LayoutKey}`));
+      let vehicleData = data;
+      if (Array.isArray(data.containers)) {
+        setManifest(data);
+        vehicleData = await fetchLayout(`key=${booking.s3LayoutKey}&vehicle=${index}`);
+      } else {
+        setManifest(null);
       }
 
-      const data = await response.json();
-
       // Validate data structure
-      if (validateLayoutData(data)) {
-        setLayoutData(data);
+      if (validateLayoutData(vehicleData)) {
+        setLayoutData(vehicleData);
       } else {
         throw new Error('Invalid layout data format');
       }
@@ -103,6 +124,11 @@ export default function Layout3DViewer({ booking, onClose }) {
     loadLayoutData();
   };
 
+  const showVehicle = (index) => {
+    setVehicleIndex(index);
+    loadLayoutData(index, manifest);
+  };
+
   return (
     <div
       className={`fixed inset-0 z-50 flex items-center justify-center bg-black bg-opacity-50 ${
@@ -122,6 +148,21 @@ export default function Layout3DViewer({ booking, onClose }) {
             3D Packing Layout - Booking #{booking.id.substring(0, 8)}
           </h3>
           <div className="flex items-center gap-2">
+            {manifest?.containers?.length > 1 && (
+              <select
+                value={vehicleIndex}
+                onChange={(e) => showVehicle(Number(e.target.value))}
+                className="text-sm border border-gray-300 rounded-lg px-2 py-1.5 bg-white"
+                title="Vehicle"
+              >
+                {manifest.containers.map((entry) => (
+                  <option key={entry.index} value={entry.index}>
+                    Vehicle {entry.index + 1}
+                    {entry.id ? ` - ${entry.id}` : ''} ({entry.total_packages} packages)
+                  </option>
+                ))}
+              </select>
+            )}
             <button
               onClick={handleReset}
               className="p-2 hover:bg-gray-200 rounded-lg transition-colors"
@@ -175,7 +216,11 @@ export default function Layout3DViewer({ booking, onClose }) {
                 <div className="mb-6">
                   <div className="flex items-center gap-2 mb-3">
                     <Box className="w-5 h-5 text-primary-600" />
-                    <h4 className="font-semibold text-gray-900">Container</h4>
+                    <h4 className="font-semibold text-gray-900">
+                      {manifest?.containers?.length > 1
+                        ? `Vehicle ${vehicleIndex + 1} of ${manifest.containers.length}`
+                        : 'Container'}
+                    </h4>
                   </div>
                   <div className="space-y-2 text-sm">
                     <div className="flex justify-between">
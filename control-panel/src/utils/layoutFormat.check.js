@@ -0,0 +1,49 @@
+/**
+ * Round-trip check of expandLayout against the analyser's columnar format
+ * fixtures/layout-columnar.json is a vehicle layout as to_columnar stores it
+ * and fixtures/layout-packages.json the same layout as package objects
+ * (from_columnar gives it back exactly). Both viewers expand layouts with
+ * expandLayout (the ui from its copy of this module), so both run this check:
+ *   npm run check:layout   (in control-panel/ or ui/)
+ * An optional argument is the path of the module to check instead of
+ * ./layoutFormat.js.
+ */
+
+import { readFileSync } from 'node:fs';
+import { resolve } from 'node:path';
+import { pathToFileURL } from 'node:url';
+
+const modulePath = process.argv[2];
+const { expandLayout } = await import(
+  modulePath ? pathToFileURL(resolve(modulePath)).href : './layoutFormat.js'
+);
+
+const fixture = (name) =>
+  JSON.parse(readFileSync(new URL(`./fixtures/${name}`, import.meta.url), 'utf8'));
+
+// JSON with sorted keys, so key order does not count
+const canonical = (value) => {
+  if (Array.isArray(value)) return `[${value.map(canonical).join(',')}]`;
+  if (value && typeof value === 'object') {
+    const keys = Object.keys(value).sort();
+    return `{${keys.map((k) => `${JSON.stringify(k)}:${canonical(value[k])}`).join(',')}}`;
+  }
+  return JSON.stringify(value);
+};
+
+const columnar = fixture('layout-columnar.json');
+const packages = fixture('layout-packages.json');
+
+const failures = [];
+if (canonical(expandLayout(columnar)) !== canonical(packages)) {
+  failures.push('columnar layout does not expand to layout-packages.json');
+}
+if (expandLayout(packages) !== packages) {
+  failures.push('a layout of package objects is not passed through as it is');
+}
+
+if (failures.length) {
+  failures.forEach((message) => console.error(`FAIL ${message}`));
+  process.exit(1);
+}
+console.log(`OK ${packages.packages.length} packages round-trip (${modulePath || 'layoutFormat.js'})`);
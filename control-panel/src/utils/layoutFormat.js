@@ -0,0 +1,43 @@
+/**
+ * Layout formats written by the analyser agent
+ * Vehicle layouts are either package objects or a columnar form (one array
+ * per field, shared product/color/orientation tables, integer coordinates);
+ * expandLayout turns either into package objects.
+ *
+ * ui/src/data/layoutFormat.js is a copy for the ui viewer; keep the two the
+ * same.
+ */
+
+const slug = (label) => label.toLowerCase().replace(/ /g, '-');
+
+export function expandLayout(data) {
+  if (!data || data.format !== 'columnar') return data;
+
+  const { columns, scale } = data;
+  const packages = columns.x.map((_, n) => {
+    const product = data.products[columns.product[n]];
+    const orderId = columns.order_id[n];
+    const label = orderId === null ? product : `${product}-order${orderId}-item${columns.item[n]}`;
+
+    const pkg = {
+      id: `${slug(label)}-${columns.copy[n]}`,
+      position: { x: columns.x[n] / scale, y: columns.y[n] / scale, z: columns.z[n] / scale },
+      size: {
+        length: columns.length[n] / scale,
+        height: columns.height[n] / scale,
+        width: columns.width[n] / scale,
+      },
+      weight: columns.weight[n],
+      color: data.colors[columns.color[n]],
+      label,
+      product,
+      placementOrder: columns.placementOrder[n],
+      fragile: Boolean(columns.fragile[n]),
+      orientation: data.orientations[columns.orientation[n]],
+    };
+    if (orderId !== null) pkg.order_id = orderId;
+    return pkg;
+  });
+
+  return { container: data.container, packages };
+}
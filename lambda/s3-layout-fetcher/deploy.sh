@@ -86,6 +86,17 @@ aws apigateway put-integration \
   --integration-http-method POST \
   --uri "arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/$LAMBDA_ARN/invocations" 2>/dev/null || true
 
+# Let gzip-compressed layouts through as binary (the Lambda returns them
+# base64-encoded as application/json with Content-Encoding: gzip; viewers
+# request them with Accept: application/json). Only that media type is
+# binary, replacing the catch-all */* of earlier deployments.
+aws apigateway update-rest-api \
+  --rest-api-id $API_ID \
+  --patch-operations 'op=remove,path=/binaryMediaTypes/*~1*' > /dev/null 2>&1 || true
+aws apigateway update-rest-api \
+  --rest-api-id $API_ID \
+  --patch-operations 'op=add,path=/binaryMediaTypes/application~1json' > /dev/null 2>&1 || true
+
 # Deploy
 aws apigateway create-deployment \
   --rest-api-id $API_ID \
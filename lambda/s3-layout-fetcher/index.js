@@ -1,3 +1,4 @@
+const zlib = require('zlib');
 const { S3Client, GetObjectCommand } = require('@aws-sdk/client-s3');
 
 const s3Client = new S3Client({ region: process.env.AWS_REGION || 'us-east-1' });
@@ -19,6 +20,64 @@ exports.handler = async (event) => {
   }
 };
 
+// Layout objects are stored gzip-compressed (older ones as plain JSON);
+// the bytes are returned as stored and only decompressed when needed.
+async function readObject(key) {
+  const response = await s3Client.send(new GetObjectCommand({
+    Bucket: BUCKET_NAME,
+    Key: key,
+  }));
+  return Buffer.from(await response.Body.transformToByteArray());
+}
+
+function isGzip(bytes) {
+  return bytes.length > 1 && bytes[0] === 0x1f && bytes[1] === 0x8b;
+}
+
+function parseObject(bytes) {
+  return JSON.parse((isGzip(bytes) ? zlib.gunzipSync(bytes) : bytes).toString('utf8'));
+}
+
+// A layout key points to a manifest listing one object per vehicle; with
+// ?vehicle=<index> only that vehicle's layout is returned.
+async function readVehicleLayout(manifestKey, vehicle) {
+  const bytes = await readObject(manifestKey);
+  const manifest = parseObject(bytes);
+
+  // Layouts saved as a single object hold one vehicle
+  if (!Array.isArray(manifest.containers)) {
+    return Number(vehicle) === 0 ? bytes : null;
+  }
+
+  const entry = manifest.containers[Number(vehicle)];
+  return entry ? readObject(entry.key) : null;
+}
+
+// Compressed objects go out as stored to clients that accept gzip (API
+// Gateway passes base64 bodies through as binary); others get plain JSON.
+function layoutResponse(event, headers, bytes) {
+  const requestHeaders = event.headers || {};
+  const acceptEncoding = Object.keys(requestHeaders)
+    .filter((name) => name.toLowerCase() === 'accept-encoding')
+    .map((name) => requestHeaders[name])
+    .join(',');
+
+  if (isGzip(bytes) && /\bgzip\b/.test(acceptEncoding)) {
+    return {
+      statusCode: 200,
+      headers: { ...headers, 'Content-Encoding': 'gzip', Vary: 'Accept-Encoding' },
+      body: bytes.toString('base64'),
+      isBase64Encoded: true,
+    };
+  }
+
+  return {
+    statusCode: 200,
+    headers,
+    body: (isGzip(bytes) ? zlib.gunzipSync(bytes) : bytes).toString('utf8'),
+  };
+}
+
 async function handleRequest(event) {
   const headers = corsHeaders;
 
@@ -29,7 +88,8 @@ async function handleRequest(event) {
   if (event.httpMethod === 'GET') {
     try {
       const s3Key = event.queryStringParameters?.key;
-      
+      const vehicle = event.queryStringParameters?.vehicle;
+
       if (!s3Key) {
         return {
           statusCode: 400,
@@ -38,18 +98,19 @@ async function handleRequest(event) {
         };
       }
 
-      const response = await s3Client.send(new GetObjectCommand({
-        Bucket: BUCKET_NAME,
-        Key: s3Key,
-      }));
+      const body = vehicle === undefined
+        ? await readObject(s3Key)
+        : await readVehicleLayout(s3Key, vehicle);
 
-      const body = await response.Body.transformToString();
-      
-      return {
-        statusCode: 200,
-        headers,
-        body: body,
-      };
+      if (body === null) {
+        return {
+          statusCode: 404,
+          headers,
+          body: JSON.stringify({ error: `Vehicle ${vehicle} not found in layout` }),
+        };
+      }
+
+      return layoutResponse(event, headers, body);
     } catch (error) {
       console.error('Error fetching layout:', error);
       
@@ -1,35 +1,61 @@
+// Columnar layouts are expanded as the control panel expands them (this is
+// a copy of its layoutFormat.js)
+import { expandLayout } from './layoutFormat.js';
+
 export class ContainerLoader {
   static async loadFromFile(file) {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onload = (e) => {
-        try {
-          const data = JSON.parse(e.target.result);
-          if (this.validate(data)) {
-            resolve(data);
-          } else {
-            reject(new Error('Invalid JSON schema'));
-          }
-        } catch (error) {
-          reject(error);
-        }
-      };
-      reader.onerror = () => reject(new Error('Failed to read file'));
-      reader.readAsText(file);
-    });
+    const data = expandLayout(JSON.parse(await this.readText(file)));
+    if (this.isManifest(data)) {
+      throw new Error('This is a layout manifest; load one of its vehicle files');
+    }
+    if (!this.validate(data)) {
+      throw new Error('Invalid JSON schema');
+    }
+    return data;
   }
 
-  static async loadFromURL(url) {
-    try {
-      const response = await fetch(url);
-      const data = await response.json();
-      if (this.validate(data)) {
-        return data;
+  // Layouts saved by the analyser are a manifest with one object per
+  // vehicle. From the layout API (/layouts?key=<manifest>) the manifest
+  // comes first and then only the vehicle asked for, as in the control
+  // panel's Layout3DViewer.
+  static async loadFromURL(url, vehicle = 0) {
+    let data = await this.fetchLayout(url);
+    if (this.isManifest(data)) {
+      if (!data.containers[vehicle]) {
+        throw new Error(`Layout has no vehicle ${vehicle}`);
       }
-      throw new Error('Invalid JSON schema');
-    } catch (error) {
-      throw error;
+      const vehicleURL = new URL(url, window.location.href);
+      vehicleURL.searchParams.set('vehicle', vehicle);
+      data = await this.fetchLayout(vehicleURL.href);
+    }
+    if (this.validate(data)) {
+      return data;
+    }
+    throw new Error('Invalid JSON schema');
+  }
+
+  // The layout API only passes gzip bodies through as binary for this type
+  static async fetchLayout(url) {
+    const response = await fetch(url, { headers: { Accept: 'application/json' } });
+    if (!response.ok) {
+      throw new Error(`Layout not found (${response.status})`);
+    }
+    return expandLayout(JSON.parse(await this.readText(await response.blob())));
+  }
+
+  static isManifest(data) {
+    return Boolean(data) && Array.isArray(data.containers);
+  }
+
+  // Layout files may be gzip-compressed (.json.gz, as the analyser stores
+  // them); servers sending Content-Encoding: gzip are decoded by fetch.
+  static async readText(blob) {
+    const head = new Uint8Array(await blob.slice(0, 2).arrayBuffer());
+    if (head[0] !== 0x1f || head[1] !== 0x8b) {
+      return blob.text();
     }
+    const stream = blob.stream().pipeThrough(new DecompressionStream('gzip'));
+    return new Response(stream).text();
   }
 
   static validate(data) {